@@ -6,25 +6,66 @@ class ConfigManager:
     """解析和管理配置文件"""
 
     def __init__(self, config_path: str):
+        self.config_path = config_path
+        self.config = self._load(config_path)
+        self.mtime = os.path.getmtime(config_path)
+
+    def _load(self, config_path: str) -> Dict:
+        """读取并校验配置文件，校验失败时抛出异常"""
         if not os.path.exists(config_path):
             raise FileNotFoundError(f"Config file not found: {config_path}")
         with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
-        self._validate_config()
+            config = yaml.safe_load(f)
+        if not isinstance(config, dict):
+            raise ValueError("Config file must contain a mapping")
+        self._validate_config(config)
+        return config
+
+    def has_changed(self) -> bool:
+        """配置文件是否在上次加载后被修改"""
+        try:
+            return os.path.getmtime(self.config_path) != self.mtime
+        except OSError:
+            return False
+
+    def reload(self) -> bool:
+        """
+        重新加载配置文件
+
+        新配置校验失败时保留旧配置并抛出异常。
 
-    def _validate_config(self) -> None:
+        Returns:
+            配置内容是否发生变化
+        """
+        # 无论成功与否都记录本次尝试的修改时间，加载失败的文件在再次修改前不会被反复解析
+        self.mtime = os.path.getmtime(self.config_path)
+        config = self._load(self.config_path)
+        if config == self.config:
+            return False
+        self.config = config
+        return True
+
+    def _validate_config(self, config: Dict) -> None:
         required_sections = ['system', 'middleware', 'monitors', 'writers', 'observers']
         for section in required_sections:
-            if section not in self.config:
+            if section not in config:
                 raise ValueError(f"Missing required section: {section}")
+        for section in ['system', 'middleware', 'writers', 'observers']:
+            if not isinstance(config[section], dict):
+                raise ValueError(f"Section '{section}' must be a mapping")
+        if config['monitors'] is not None and not isinstance(config['monitors'], list):
+            raise ValueError("Section 'monitors' must be a list")
+        for section in ['cluster', 'correlation', 'blocklist', 'normalize', 'rollup', 'sessions', 'latency']:
+            if config.get(section) is not None and not isinstance(config[section], dict):
+                raise ValueError(f"Section '{section}' must be a mapping")
 
         # 验证 system
-        system_config = self.config['system']
+        system_config = config['system']
         if 'filter_internal_ip' not in system_config or 'filter_superfluous_ip' not in system_config:
             raise ValueError("System must specify 'filter_internal_ip' and 'filter_superfluous_ip'")
 
         # 验证 middleware
-        middleware_config = self.config['middleware']
+        middleware_config = config['middleware']
         if 'type' not in middleware_config:
             raise ValueError("Middleware must specify 'type'")
         if middleware_config['type'] != 'nginx':
@@ -34,32 +75,215 @@ class ConfigManager:
         for key in ['config', 'sites_dir', 'logs_dir']:
             if not isinstance(middleware_config[key], str) or not middleware_config[key]:
                 raise ValueError(f"Middleware '{key}' must be a non-empty string")
+        if middleware_config.get('log_format_version', 1) not in (1, 2):
+            raise ValueError("Middleware 'log_format_version' must be 1 or 2")
 
         # 验证 monitors
-        if self.config['monitors'] is not None:
-            for monitor in self.config['monitors']:
+        if config['monitors'] is not None:
+            for monitor in config['monitors']:
+                if not isinstance(monitor, dict):
+                    raise ValueError("Each monitor must be a mapping")
+                if monitor.get('type', 'network') != 'network':
+                    # 自定义监控器的参数由其实现校验
+                    if not isinstance(monitor['type'], str):
+                        raise ValueError("Monitor 'type' must be a string")
+                    continue
                 if 'interface' not in monitor or 'interval' not in monitor:
                     raise ValueError("Each monitor must specify 'interface' and 'interval'")
                 if not isinstance(monitor['interval'], int) or monitor['interval'] <= 0:
                     raise ValueError("Monitor 'interval' must be a positive integer")
                 if 'ports' in monitor and not isinstance(monitor['ports'], list):
                     raise ValueError("Monitor 'ports' must be a list of integers")
+                if 'workers' in monitor and (not isinstance(monitor['workers'], int) or monitor['workers'] <= 0):
+                    raise ValueError("Monitor 'workers' must be a positive integer")
+                sampling = monitor.get('sampling')
+                if sampling is not None:
+                    if not isinstance(sampling, dict) or not isinstance(sampling.get('budget'), int) or sampling['budget'] <= 0:
+                        raise ValueError("Monitor 'sampling' must specify a positive integer 'budget'")
+                    if sampling.get('mode', 'count') not in ['count', 'flow']:
+                        raise ValueError("Monitor sampling 'mode' must be 'count' or 'flow'")
+                    if 'max_rate' in sampling and (not isinstance(sampling['max_rate'], int) or sampling['max_rate'] <= 0):
+                        raise ValueError("Monitor sampling 'max_rate' must be a positive integer")
+                    unknown = set(sampling) - {'budget', 'mode', 'window', 'max_rate'}
+                    if unknown:
+                        raise ValueError(f"Unknown sampling options: {', '.join(sorted(unknown))}")
+                flows = monitor.get('flows')
+                if flows is not None:
+                    if not isinstance(flows, dict):
+                        raise ValueError("Monitor 'flows' must be a mapping")
+                    for key in ['max_flows', 'idle_timeout', 'active_timeout']:
+                        if key in flows and (not isinstance(flows[key], (int, float)) or flows[key] <= 0):
+                            raise ValueError(f"Monitor flows '{key}' must be a positive number")
+                    unknown = set(flows) - {'max_flows', 'idle_timeout', 'active_timeout'}
+                    if unknown:
+                        raise ValueError(f"Unknown flows options: {', '.join(sorted(unknown))}")
 
         # 验证 writers
-        writer_config = self.config['writers']
+        writer_config = config['writers']
         if 'path' not in writer_config or 'format' not in writer_config or 'interval_type' not in writer_config:
             raise ValueError("Writers must specify 'path', 'format', and 'interval_type'")
-        if writer_config['format'] not in ['csv', 'txt', 'log']:
-            raise ValueError("Unsupported format, must be 'csv', 'txt', or 'log'")
+        if writer_config['format'] not in ['csv', 'txt', 'log', 'jsonl', 'sqlite']:
+            raise ValueError("Unsupported format, must be 'csv', 'txt', 'log', 'jsonl', or 'sqlite'")
         if writer_config['interval_type'] not in ['week', 'day', 'hour']:
             raise ValueError("Unsupported interval_type, must be 'week', 'day', or 'hour'")
         if 'fake_img' not in writer_config:
             raise ValueError("Writers must specify 'fake_img'")
         if not isinstance(writer_config['fake_img'], bool):
             raise ValueError("Writers 'fake_img' must be a boolean")
+        spool_config = writer_config.get('spool')
+        if spool_config is not None:
+            if not isinstance(spool_config, dict):
+                raise ValueError("Writers 'spool' must be a mapping")
+            if not isinstance(spool_config.get('enabled', False), bool):
+                raise ValueError("Spool 'enabled' must be a boolean")
+            if spool_config.get('enabled') and not spool_config.get('path'):
+                raise ValueError("Spool must specify 'path' when enabled")
+            for key in ['segment_size_mb', 'max_segments']:
+                if key in spool_config and (not isinstance(spool_config[key], int) or spool_config[key] <= 0):
+                    raise ValueError(f"Spool '{key}' must be a positive integer")
+            if spool_config.get('max_segments', 2) < 2:
+                raise ValueError("Spool 'max_segments' must be at least 2")
+            if spool_config.get('overflow', 'drop_oldest') not in ['drop_oldest', 'drop_new']:
+                raise ValueError("Unsupported spool overflow, must be 'drop_oldest' or 'drop_new'")
+
+        # 验证 cluster（可选，agent/collector 模式使用）
+        cluster_config = config.get('cluster')
+        if cluster_config is not None:
+            if not isinstance(cluster_config, dict) or not isinstance(cluster_config.get('address'), str):
+                raise ValueError("Cluster must specify 'address' as host:port or unix:/path")
+            for key in ['batch_size', 'buffer_records']:
+                if key in cluster_config and (not isinstance(cluster_config[key], int) or cluster_config[key] <= 0):
+                    raise ValueError(f"Cluster '{key}' must be a positive integer")
+            if cluster_config.get('compress_level', 1) not in range(0, 10):
+                raise ValueError("Cluster 'compress_level' must be between 0 and 9")
+
+        # 验证 rules / alerts（可选）
+        rules = config.get('rules')
+        if rules is not None:
+            if not isinstance(rules, list):
+                raise ValueError("Rules must be a list")
+            names = set()
+            for rule in rules:
+                if not isinstance(rule, dict) or not rule.get('name') or 'threshold' not in rule:
+                    raise ValueError("Each rule must specify 'name' and 'threshold'")
+                if rule['name'] in names:
+                    raise ValueError(f"Duplicate rule name: {rule['name']}")
+                names.add(rule['name'])
+                for key in ['threshold', 'window', 'cooldown', 'max_keys']:
+                    if key in rule and (not isinstance(rule[key], int) or rule[key] <= 0):
+                        raise ValueError(f"Rule '{key}' must be a positive integer")
+                if rule.get('source', 'any') not in ['any', 'nginx', 'network']:
+                    raise ValueError("Rule 'source' must be 'any', 'nginx' or 'network'")
+                if 'key' in rule and (not isinstance(rule['key'], list) or not rule['key']):
+                    raise ValueError("Rule 'key' must be a non-empty list of field names")
+                unknown = set(rule) - {'name', 'threshold', 'window', 'key', 'source', 'distinct',
+                                       'cooldown', 'max_keys'}
+                if unknown:
+                    raise ValueError(f"Unknown rule options: {', '.join(sorted(unknown))}")
+        alerts_config = config.get('alerts')
+        if alerts_config is not None:
+            if not isinstance(alerts_config, dict):
+                raise ValueError("Alerts must be a mapping")
+            alert_type = alerts_config.get('type', 'file')
+            if alert_type not in ['file', 'webhook', 'command']:
+                raise ValueError("Alerts 'type' must be 'file', 'webhook' or 'command'")
+            if alert_type == 'webhook' and not alerts_config.get('url'):
+                raise ValueError("Webhook alerts must specify 'url'")
+            if alert_type == 'command' and not alerts_config.get('command'):
+                raise ValueError("Command alerts must specify 'command'")
+
+        # 验证 correlation（可选）
+        correlation_config = config.get('correlation')
+        if correlation_config is not None:
+            if not isinstance(correlation_config, dict) or not isinstance(correlation_config.get('enabled', False), bool):
+                raise ValueError("Correlation 'enabled' must be a boolean")
+            for key in ['max_skew', 'retention', 'max_entries', 'max_pending']:
+                if key in correlation_config and (not isinstance(correlation_config[key], int) or correlation_config[key] <= 0):
+                    raise ValueError(f"Correlation '{key}' must be a positive integer")
+            if 'capture_delay' in correlation_config and (not isinstance(correlation_config['capture_delay'], int)
+                                                          or correlation_config['capture_delay'] < 0):
+                raise ValueError("Correlation 'capture_delay' must be a non-negative integer")
+            unknown = set(correlation_config) - {'enabled', 'max_skew', 'retention', 'max_entries', 'max_pending',
+                                                 'capture_delay'}
+            if unknown:
+                raise ValueError(f"Unknown correlation options: {', '.join(sorted(unknown))}")
+
+        # 验证 blocklist（可选）
+        blocklist_config = config.get('blocklist')
+        if blocklist_config is not None:
+            if not isinstance(blocklist_config, dict) or not isinstance(blocklist_config.get('enabled', False), bool):
+                raise ValueError("Blocklist 'enabled' must be a boolean")
+            if blocklist_config.get('enabled') and not isinstance(blocklist_config.get('path'), str):
+                raise ValueError("Blocklist must specify 'path' of a compiled blocklist")
+            fields = blocklist_config.get('fields')
+            if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+                raise ValueError("Blocklist 'fields' must be a list of field names")
+            if 'cache_size' in blocklist_config and (not isinstance(blocklist_config['cache_size'], int) or blocklist_config['cache_size'] <= 0):
+                raise ValueError("Blocklist 'cache_size' must be a positive integer")
+            unknown = set(blocklist_config) - {'enabled', 'path', 'fields', 'cache_size'}
+            if unknown:
+                raise ValueError(f"Unknown blocklist options: {', '.join(sorted(unknown))}")
+
+        # 验证 normalize（可选）
+        normalize_config = config.get('normalize')
+        if normalize_config is not None:
+            if not isinstance(normalize_config, dict) or not isinstance(normalize_config.get('enabled', False), bool):
+                raise ValueError("Normalize 'enabled' must be a boolean")
+            keep_params = normalize_config.get('keep_params')
+            if keep_params is not None and (not isinstance(keep_params, list) or not all(isinstance(p, str) for p in keep_params)):
+                raise ValueError("Normalize 'keep_params' must be a list of parameter names")
+            if not isinstance(normalize_config.get('rewrite_url', False), bool):
+                raise ValueError("Normalize 'rewrite_url' must be a boolean")
+            for key in ['max_children', 'max_nodes', 'max_depth', 'cache_size', 'max_sites']:
+                if key in normalize_config and (not isinstance(normalize_config[key], int) or normalize_config[key] <= 0):
+                    raise ValueError(f"Normalize '{key}' must be a positive integer")
+            unknown = set(normalize_config) - {'enabled', 'keep_params', 'rewrite_url', 'max_children', 'max_nodes',
+                                               'max_depth', 'cache_size', 'max_sites'}
+            if unknown:
+                raise ValueError(f"Unknown normalize options: {', '.join(sorted(unknown))}")
+
+        # 验证 rollup（可选）
+        rollup_config = config.get('rollup')
+        if rollup_config is not None:
+            if not isinstance(rollup_config, dict) or not isinstance(rollup_config.get('enabled', False), bool):
+                raise ValueError("Rollup 'enabled' must be a boolean")
+            if 'grace' in rollup_config and (not isinstance(rollup_config['grace'], int) or rollup_config['grace'] < 0):
+                raise ValueError("Rollup 'grace' must be a non-negative integer")
+            if 'precision' in rollup_config and rollup_config['precision'] not in range(4, 17):
+                raise ValueError("Rollup 'precision' must be an integer between 4 and 16")
+            unknown = set(rollup_config) - {'enabled', 'grace', 'precision'}
+            if unknown:
+                raise ValueError(f"Unknown rollup options: {', '.join(sorted(unknown))}")
+
+        # 验证 sessions（可选）
+        sessions_config = config.get('sessions')
+        if sessions_config is not None:
+            if not isinstance(sessions_config, dict) or not isinstance(sessions_config.get('enabled', False), bool):
+                raise ValueError("Sessions 'enabled' must be a boolean")
+            for key in ['gap', 'max_sessions', 'max_urls']:
+                if key in sessions_config and (not isinstance(sessions_config[key], int) or sessions_config[key] <= 0):
+                    raise ValueError(f"Sessions '{key}' must be a positive integer")
+            unknown = set(sessions_config) - {'enabled', 'gap', 'max_sessions', 'max_urls'}
+            if unknown:
+                raise ValueError(f"Unknown sessions options: {', '.join(sorted(unknown))}")
+
+        # 验证 latency（可选）
+        latency_config = config.get('latency')
+        if latency_config is not None:
+            if not isinstance(latency_config, dict) or not isinstance(latency_config.get('enabled', False), bool):
+                raise ValueError("Latency 'enabled' must be a boolean")
+            for key in ['prefix_depth', 'grace']:
+                if key in latency_config and (not isinstance(latency_config[key], int) or latency_config[key] < 0):
+                    raise ValueError(f"Latency '{key}' must be a non-negative integer")
+            if 'max_keys' in latency_config and (not isinstance(latency_config['max_keys'], int)
+                                                 or latency_config['max_keys'] <= 0):
+                raise ValueError("Latency 'max_keys' must be a positive integer")
+            unknown = set(latency_config) - {'enabled', 'prefix_depth', 'max_keys', 'grace'}
+            if unknown:
+                raise ValueError(f"Unknown latency options: {', '.join(sorted(unknown))}")
 
         # 验证 observers
-        observer_config = self.config['observers']
+        observer_config = config['observers']
         if 'enabled' not in observer_config or 'cleanup_days' not in observer_config:
             raise ValueError("Observers must specify 'enabled' and 'cleanup_days'")
         if not isinstance(observer_config['enabled'], bool):
@@ -79,6 +303,9 @@ class ConfigManager:
     def get_writers_config(self) -> Dict:
         return self.config['writers']
 
+    def get_cluster_config(self) -> Dict:
+        return self.config.get('cluster')
+
     def get_observers_config(self) -> Dict:
         return self.config['observers']
 
@@ -0,0 +1,124 @@
+"""
+记录序列化基准测试
+
+分两部分测量，两种实现始终写入同一种目标，结果才可比较：
+- 只序列化：生成的 CSV / JSON Lines 序列化函数与 csv.DictWriter / json.dumps 写入同一个 StringIO
+- 写入文件：TrafficWriter 各格式与"按批打开文件 + DictWriter / json.dumps"的写法写入同一目录下的文件
+另外测量 sqlite 分段中按单个 IP 查询的耗时：
+    python example/serializer_bench.py --records 200000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from writers.schema import FIELD_NAMES, compile_jsonl, write_csv_rows
+from writers.writer import TrafficWriter
+
+BATCH = 5000  # 与主循环每轮写入的规模相当
+
+
+def make_records(count: int):
+    nginx = [{
+        "timestamp": "2025-04-09 11:27:56",
+        "src_ip": f"203.0.113.{i % 250}",
+        "src_port": str(40000 + i % 20000),
+        "interface": "nginx",
+        "url": f"https://example.com/item/{i}?q=\"a,b\"",
+        "user_agent": "Mozilla/5.0 (X11; Linux x86_64)",
+        "status": 200,
+        "body_bytes": 5120,
+        "site": "example.com",
+    } for i in range(count)]
+    network = [{
+        "timestamp": "2025-04-09 11:27:56",
+        "src_ip": f"198.51.100.{i % 250}",
+        "src_port": 40000 + i % 20000,
+        "dest_ip": "10.0.0.1",
+        "dest_port": 22,
+        "protocol": 6,
+        "interface": "eth0",
+        "packets": 12,
+        "bytes": 4096,
+        "last_seen": "2025-04-09 11:28:01",
+        "sample_rate": 1,
+    } for i in range(count)]
+    return nginx, network
+
+
+def bench(label: str, function, records, repeat: int = 3) -> None:
+    """按批调用 function，与主循环的写入方式一致；重复 repeat 次取最快的一次，减少抖动"""
+    elapsed = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(0, len(records), BATCH):
+            function(records[i:i + BATCH])
+        elapsed = min(elapsed, time.perf_counter() - start)
+    print(f"{label:<32}{len(records) / elapsed:>14,.0f} records/s{elapsed / len(records) * 1e6:>10.2f} us/record")
+
+
+def dict_writer_rows(f, records) -> None:
+    csv.DictWriter(f, fieldnames=FIELD_NAMES, extrasaction='ignore').writerows(records)
+
+
+def json_dumps_lines(f, records) -> None:
+    f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+
+def jsonl_lines(f, records) -> None:
+    f.writelines(map(compile_jsonl(), records))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record serializer benchmark")
+    parser.add_argument('--records', type=int, default=200000)
+    args = parser.parse_args()
+
+    nginx, network = make_records(args.records)
+
+    print("serialize only (StringIO sink)")
+    for label, function in (("generated csv", lambda f, records: write_csv_rows(f, FIELD_NAMES, records)),
+                            ("baseline DictWriter", dict_writer_rows),
+                            ("generated jsonl", jsonl_lines),
+                            ("baseline json.dumps", json_dumps_lines)):
+        for kind, records in (("nginx", nginx), ("network", network)):
+            bench(f"  {label} {kind}", lambda batch: function(io.StringIO(), batch), records)
+
+    workdir = tempfile.mkdtemp(prefix="ezmonitor-bench-")
+    print(f"write to file ({workdir})")
+    for label, function in (("baseline DictWriter", dict_writer_rows), ("baseline json.dumps", json_dumps_lines)):
+        for kind, records in (("nginx", nginx), ("network", network)):
+            filename = os.path.join(workdir, f"{label.split()[1]}-{kind}.out")
+
+            def append(batch, filename=filename, function=function):
+                with open(filename, "a", encoding="utf-8", newline="") as f:
+                    function(f, batch)
+
+            bench(f"  {label} {kind}", append, records)
+    for format in ("csv", "txt", "log", "jsonl", "sqlite"):
+        writer = TrafficWriter(os.path.join(workdir, format), format, "day")
+        # sqlite 每次重复都会让表和索引变大，只测一次
+        repeat = 1 if format == "sqlite" else 3
+        bench(f"  {format} nginx", writer.write, nginx, repeat)
+        bench(f"  {format} network", writer.write, network, repeat)
+        if format == "sqlite":
+            connection = sqlite3.connect(writer.current_file)
+            start = time.perf_counter()
+            for i in range(100):
+                connection.execute("SELECT timestamp, url, status FROM records WHERE src_ip = ?",
+                                   (f"203.0.113.{i}",)).fetchall()
+            print(f"{'  sqlite query by src_ip':<32}{(time.perf_counter() - start) * 10:>14.2f} ms/query "
+                  f"({2 * args.records:,} rows, {args.records // 250:,} matches)")
+            connection.close()
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
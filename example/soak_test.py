@@ -0,0 +1,273 @@
+"""
+长时间运行测试（soak test）
+
+在进程内运行与 main.py 相同的完整流程（监控器 → 处理阶段 → 记录器），由合成的 Nginx 日志写入线程
+和可选的 pcap 回放提供输入，定期采样 RSS 与 tracemalloc 分配点，运行结束后按预热期之后的 RSS
+线性增长率判定是否存在内存泄漏，并列出增长最多的分配点：
+    python example/soak_test.py --duration 14400 --rate 200
+    sudo python example/soak_test.py --duration 14400 --pcap capture.pcap --interface lo
+
+增长率超过 --max-growth（MiB/小时）时以退出码 1 结束，报告同时写入工作目录下的 soak_report.json。
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_manager import ConfigManager
+from service import MonitorService
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/124.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "curl/8.5.0",
+    "Googlebot/2.1 (+http://www.google.com/bot.html)",
+]
+STATUSES = [200] * 16 + [301, 304, 404, 500]
+
+
+def read_rss() -> int:
+    """当前进程常驻内存（字节）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        # 非 Linux 平台只能取峰值
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def growth_per_hour(samples) -> float:
+    """最小二乘拟合 (秒, 字节) 序列的斜率，单位 MiB/小时"""
+    n = len(samples)
+    mean_t = sum(t for t, _ in samples) / n
+    mean_v = sum(v for _, v in samples) / n
+    denominator = sum((t - mean_t) ** 2 for t, _ in samples)
+    if not denominator:
+        return 0.0
+    slope = sum((t - mean_t) * (v - mean_v) for t, v in samples) / denominator
+    return slope * 3600 / 1024 / 1024
+
+
+class NginxLogWriter(threading.Thread):
+    """按指定速率向多个站点日志追加 custom 格式的访问记录，超过大小后像 logrotate 一样轮转"""
+
+    def __init__(self, logs_dir: str, sites: int, rate: int, ip_pool: int, rotate_mb: int, stop_event):
+        super().__init__(name="soak-nginx-writer", daemon=True)
+        self.paths = [os.path.join(logs_dir, f"site{i}.example.com.log") for i in range(sites)]
+        self.rate = rate
+        self.ip_pool = ip_pool
+        self.rotate_bytes = rotate_mb * 1024 * 1024
+        self.stop_event = stop_event
+        self.written = 0
+        for path in self.paths:
+            open(path, "a").close()
+
+    def _line(self, now: str) -> str:
+        ip = random.randrange(self.ip_pool)
+        address = f"198.{(ip >> 16) & 0xFF}.{(ip >> 8) & 0xFF}.{ip & 0xFF}"
+        url = f"https://example.com/item/{random.randrange(100000)}?page={random.randrange(20)}"
+        return (f"{address}|{random.randrange(1024, 65536)}|[{now}]|{url}|{random.choice(STATUSES)} "
+                f"{random.randrange(100, 50000)}|\"-\"|[UA]{random.choice(USER_AGENTS)}[UA]|10.0.0.1|443\n")
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            now = datetime.now().astimezone().strftime("%d/%b/%Y:%H:%M:%S %z")
+            lines = {path: [] for path in self.paths}
+            for _ in range(self.rate):
+                lines[random.choice(self.paths)].append(self._line(now))
+            for path, batch in lines.items():
+                if os.path.exists(path) and os.path.getsize(path) > self.rotate_bytes:
+                    os.replace(path, path + ".1")
+                with open(path, "a") as f:
+                    f.writelines(batch)
+            self.written += self.rate
+            self.stop_event.wait(max(0.0, 1 - (time.monotonic() - started)))
+
+
+class PcapReplayer(threading.Thread):
+    """循环回放 pcap 文件到指定网卡"""
+
+    def __init__(self, pcap: str, interface: str, pps: int, stop_event):
+        super().__init__(name="soak-pcap-replay", daemon=True)
+        from scapy.all import rdpcap
+        self.packets = rdpcap(pcap)
+        self.interface = interface
+        self.pps = pps
+        self.stop_event = stop_event
+        self.sent = 0
+
+    def run(self) -> None:
+        from scapy.all import sendp
+        while not self.stop_event.is_set():
+            for start in range(0, len(self.packets), self.pps):
+                if self.stop_event.is_set():
+                    return
+                started = time.monotonic()
+                batch = self.packets[start:start + self.pps]
+                sendp(batch, iface=self.interface, verbose=False)
+                self.sent += len(batch)
+                self.stop_event.wait(max(0.0, 1 - (time.monotonic() - started)))
+
+
+def build_config(args, workdir: str) -> str:
+    """以 --config 为基础生成测试配置，日志目录和输出目录指向工作目录"""
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    logs_dir = os.path.join(workdir, "nginx")
+    os.makedirs(logs_dir, exist_ok=True)
+    config["middleware"] = dict(config.get("middleware") or {}, type="nginx", logs_dir=logs_dir, logrotate=False)
+    config["monitors"] = [{"interface": args.interface, "interval": 1}] if args.pcap else []
+    config["writers"] = dict(config["writers"], path=os.path.join(workdir, "output"))
+    spool = config["writers"].get("spool")
+    if spool and spool.get("enabled"):
+        config["writers"]["spool"] = dict(spool, path=os.path.join(workdir, "spool"))
+    path = os.path.join(workdir, "soak_config.yaml")
+    with open(path, "w") as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return path
+
+
+def snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ])
+
+
+def top_growth(baseline, current, hours: float, top: int, nframes: int):
+    """对比预热结束时与最后一次的快照，返回增长最多的分配点"""
+    group_by = "traceback" if nframes > 1 else "lineno"
+    sites = []
+    for stat in current.compare_to(baseline, group_by)[:top]:
+        if stat.size_diff <= 0:
+            break
+        sites.append({
+            "site": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            "size_diff_kib": round(stat.size_diff / 1024, 1),
+            "count_diff": stat.count_diff,
+            "kib_per_hour": round(stat.size_diff / 1024 / hours, 1) if hours else None,
+            "size_kib": round(stat.size / 1024, 1),
+        })
+    return sites
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test with memory-growth tracking")
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), "config.yaml"), help="基础配置文件，处理阶段和写入格式沿用其中的设置")
+    parser.add_argument('--workdir', help="工作目录，默认新建临时目录")
+    parser.add_argument('--duration', type=int, default=3600, help="运行时长（秒）")
+    parser.add_argument('--warmup', type=int, default=300, help="预热时长（秒），不计入增长率")
+    parser.add_argument('--sample-interval', type=int, default=60, help="采样间隔（秒）")
+    parser.add_argument('--max-growth', type=float, default=16, help="允许的 RSS 增长率（MiB/小时）")
+    parser.add_argument('--rate', type=int, default=100, help="每秒写入的 Nginx 日志行数")
+    parser.add_argument('--sites', type=int, default=4, help="合成站点数")
+    parser.add_argument('--ip-pool', type=int, default=1 << 20, help="源 IP 取值范围，越大越能暴露按 key 无界增长的状态")
+    parser.add_argument('--rotate-mb', type=int, default=64, help="单个日志文件超过该大小时轮转")
+    parser.add_argument('--pcap', help="回放的 pcap 文件（需要 root 权限）")
+    parser.add_argument('--interface', default="lo", help="pcap 回放及抓包的网卡")
+    parser.add_argument('--pps', type=int, default=1000, help="pcap 回放速率（包/秒）")
+    parser.add_argument('--top', type=int, default=15, help="报告中列出的分配点数量")
+    parser.add_argument('--nframes', type=int, default=1, help="tracemalloc 记录的栈深度")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ezmonitor-soak-")
+    os.makedirs(workdir, exist_ok=True)
+    config_manager = ConfigManager(build_config(args, workdir))
+    stop_event = threading.Event()
+    log_writer = NginxLogWriter(os.path.join(workdir, "nginx"), args.sites, args.rate, args.ip_pool,
+                                args.rotate_mb, stop_event)
+    replayer = PcapReplayer(args.pcap, args.interface, args.pps, stop_event) if args.pcap else None
+
+    tracemalloc.start(args.nframes)
+    service = MonitorService(config_manager, poll_interval=1)
+    samples = []
+    baseline = current = None
+    started = time.monotonic()
+    # 监控器和记录器的逐条输出会淹没报告，运行期间丢弃标准输出
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        log_writer.start()
+        if replayer:
+            replayer.start()
+        service.start()
+        runner = threading.Thread(target=service.run_forever, name="soak-service", daemon=True)
+        runner.start()
+        try:
+            while True:
+                elapsed = time.monotonic() - started
+                rss = read_rss()
+                traced = tracemalloc.get_traced_memory()[0]
+                samples.append({"elapsed": round(elapsed, 1), "rss": rss, "traced": traced})
+                print(f"[{elapsed:7.0f}s] rss={rss / 1048576:.1f} MiB traced={traced / 1048576:.1f} MiB "
+                      f"nginx_lines={log_writer.written}", file=sys.stderr)
+                if baseline is None and elapsed >= args.warmup:
+                    baseline = snapshot()
+                    baseline_elapsed = elapsed
+                if elapsed >= args.duration:
+                    break
+                time.sleep(min(args.sample_interval, max(0.0, args.duration - elapsed)))
+        except KeyboardInterrupt:
+            pass
+        current = snapshot()
+        stats = service.stats()
+        stop_event.set()
+        service.stop()
+        runner.join()
+        service.shutdown()
+    tracemalloc.stop()
+
+    measured = [sample for sample in samples if sample["elapsed"] >= args.warmup]
+    report = {
+        "duration": samples[-1]["elapsed"],
+        "warmup": args.warmup,
+        "nginx_lines": log_writer.written,
+        "pcap_packets": replayer.sent if replayer else 0,
+        "samples": samples,
+        "stats": stats,
+    }
+    if len(measured) >= 3 and baseline is not None:
+        hours = (samples[-1]["elapsed"] - baseline_elapsed) / 3600
+        report["rss_growth_mib_per_hour"] = round(growth_per_hour([(s["elapsed"], s["rss"]) for s in measured]), 2)
+        report["traced_growth_mib_per_hour"] = round(
+            growth_per_hour([(s["elapsed"], s["traced"]) for s in measured]), 2)
+        report["top_growth"] = top_growth(baseline, current, hours, args.top, args.nframes)
+        report["passed"] = report["rss_growth_mib_per_hour"] <= args.max_growth
+    else:
+        report["passed"] = None  # 预热后的样本不足，无法判定
+
+    report_path = os.path.join(workdir, "soak_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+
+    print(f"duration: {report['duration']:.0f}s, nginx lines: {report['nginx_lines']}, "
+          f"pcap packets: {report['pcap_packets']}")
+    if report["passed"] is None:
+        print(f"inconclusive: fewer than 3 samples after {args.warmup}s warmup")
+    else:
+        print(f"RSS growth: {report['rss_growth_mib_per_hour']} MiB/h "
+              f"(limit {args.max_growth}), traced: {report['traced_growth_mib_per_hour']} MiB/h")
+        print("top allocation growth since warmup:")
+        for site in report["top_growth"]:
+            print(f"  {site['size_diff_kib']:>10} KiB  {site['kib_per_hour']:>10} KiB/h  "
+                  f"{site['count_diff']:>+8} blocks  {' <- '.join(site['site'])}")
+        print("PASSED" if report["passed"] else "FAILED: memory growth exceeds limit")
+    print(f"report: {report_path}")
+    sys.exit(1 if report["passed"] is False else 0)
+
+
+if __name__ == "__main__":
+    main()
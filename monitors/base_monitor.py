@@ -0,0 +1,42 @@
+import queue
+from typing import List, Dict
+
+class BaseMonitor:
+    """
+    监控器基类
+
+    监控器在后台采集数据，以 {来源: [记录, ...]} 的形式放入输出队列，由主循环通过 drain() 取出写入。
+    新的数据源继承此类并在 MonitorFactory 中注册类型名即可通过配置启用。
+    """
+
+    def __init__(self, packet_queue=None):
+        """
+        Args:
+            packet_queue: 输出队列，默认为内存队列；启用磁盘队列时由服务统一传入
+        """
+        self.packet_queue = packet_queue if packet_queue is not None else queue.Queue()
+        self.is_running = False
+        self.thread = None
+
+    def start(self) -> None:
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        raise NotImplementedError
+
+    def drain(self) -> List[Dict]:
+        """取出输出队列中当前全部数据"""
+        items = []
+        while True:
+            try:
+                items.append(self.packet_queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def stats(self) -> Dict:
+        """运行统计，定期输出到日志"""
+        return {}
+
+    def get_packet_queue(self) -> queue.Queue:
+        return self.packet_queue
@@ -0,0 +1,271 @@
+import os
+import time
+import queue
+import socket
+import struct
+import logging
+import threading
+import ipaddress
+import multiprocessing
+from typing import Optional, Set, Dict, List
+
+from monitors.base_monitor import BaseMonitor
+from monitors.sampling import AdaptiveSampler
+from monitors.flow_table import FlowTable, flow_records
+
+logger = logging.getLogger(__name__)
+
+# linux/if_packet.h
+SOL_PACKET = 263
+PACKET_FANOUT = 18
+PACKET_FANOUT_HASH = 0
+PACKET_FANOUT_FLAG_DEFRAG = 0x8000
+ETH_P_ALL = 0x0003
+
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86DD
+ETH_P_8021Q = 0x8100
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+INTERNAL_NETWORKS = [
+    ipaddress.ip_network("10.0.0.0/8"),
+    ipaddress.ip_network("172.16.0.0/12"),
+    ipaddress.ip_network("192.168.0.0/16"),
+    ipaddress.ip_network("127.0.0.0/8"),
+]
+
+
+def parse_frame(frame: memoryview, length: int):
+    """
+    解析以太网帧，返回 (src_ip, dest_ip, src_port, dest_port, protocol, ip_length)，IP 地址为原始字节，
+    ip_length 取自 IP 头的长度字段（与 scapy 路径的 ip.len 一致），不含短帧的以太网填充；非 IP 帧返回 None
+    """
+    if length < 14:
+        return None
+    offset = 12
+    ethertype = (frame[offset] << 8) | frame[offset + 1]
+    offset += 2
+    if ethertype == ETH_P_8021Q and length >= 18:
+        ethertype = (frame[offset + 2] << 8) | frame[offset + 3]
+        offset += 4
+    if ethertype == ETH_P_IP:
+        if length < offset + 20:
+            return None
+        ihl = (frame[offset] & 0x0F) * 4
+        protocol = frame[offset + 9]
+        ip_length = (frame[offset + 2] << 8) | frame[offset + 3]
+        src = bytes(frame[offset + 12:offset + 16])
+        dst = bytes(frame[offset + 16:offset + 20])
+        # 非首个分片不含端口
+        fragment_offset = ((frame[offset + 6] & 0x1F) << 8) | frame[offset + 7]
+        offset += ihl
+        if fragment_offset:
+            return src, dst, 0, 0, protocol, ip_length
+    elif ethertype == ETH_P_IPV6:
+        if length < offset + 40:
+            return None
+        protocol = frame[offset + 6]
+        ip_length = ((frame[offset + 4] << 8) | frame[offset + 5]) + 40
+        src = bytes(frame[offset + 8:offset + 24])
+        dst = bytes(frame[offset + 24:offset + 40])
+        offset += 40
+    else:
+        return None
+    if protocol in (IPPROTO_TCP, IPPROTO_UDP) and length >= offset + 4:
+        src_port = (frame[offset] << 8) | frame[offset + 1]
+        dest_port = (frame[offset + 2] << 8) | frame[offset + 3]
+        return src, dst, src_port, dest_port, protocol, ip_length
+    return src, dst, 0, 0, protocol, ip_length
+
+
+def _format_ip(raw: bytes) -> str:
+    return socket.inet_ntop(socket.AF_INET if len(raw) == 4 else socket.AF_INET6, raw)
+
+
+def _is_internal(raw: bytes, cache: Dict[bytes, bool]) -> bool:
+    internal = cache.get(raw)
+    if internal is None:
+        if len(cache) > 100000:
+            cache.clear()
+        address = ipaddress.ip_address(raw)
+        internal = any(address in network for network in INTERNAL_NETWORKS)
+        cache[raw] = internal
+    return internal
+
+
+def _build_batch(flows: List[tuple], filter_internal_ip: bool, internal_cache: Dict[bytes, bool]) -> List[tuple]:
+    """过滤内网源地址并将 IP 转为字符串，批次格式与 FlowTable 导出一致"""
+    batch = []
+    for (src, dst, src_port, dest_port, protocol), packets, length, first_seen, last_seen in flows:
+        if filter_internal_ip and _is_internal(src, internal_cache):
+            continue
+        batch.append(((_format_ip(src), _format_ip(dst), src_port, dest_port, protocol),
+                      packets, length, first_seen, last_seen))
+    return batch
+
+
+def capture_worker(worker_id: int, interface: str, group_id: int, ports: Set[int], filter_internal_ip: bool,
+                   sampling: Optional[Dict], flows: Optional[Dict], batch_interval: float,
+                   result_queue, stop_event) -> None:
+    """
+    抓包工作进程：加入 PACKET_FANOUT 组（按流哈希分配，同一连接始终由同一进程处理），
+    在本地过滤并汇入流表，每 batch_interval 秒将已导出的流批量发回主进程
+    """
+    try:
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        sock.bind((interface, 0))
+        fanout = group_id | ((PACKET_FANOUT_HASH | PACKET_FANOUT_FLAG_DEFRAG) << 16)
+        sock.setsockopt(SOL_PACKET, PACKET_FANOUT, struct.pack("I", fanout))
+        sock.settimeout(0.2)
+    except OSError as e:
+        result_queue.put(("error", worker_id, str(e)))
+        return
+    sampler = AdaptiveSampler(**sampling) if sampling else None
+    buffer = bytearray(65536)
+    view = memoryview(buffer)
+    flow_table = FlowTable(**(flows or {}))
+    internal_cache = {}
+    seen = 0
+    last_flush = time.time()
+
+    while not stop_event.is_set():
+        try:
+            length = sock.recv_into(buffer)
+            # count 模式在解析前采样，丢弃的帧不解析
+            if sampler is not None and sampler.mode == "count" and not sampler.sample():
+                seen += 1
+                parsed = None
+            else:
+                parsed = parse_frame(view, length)
+        except socket.timeout:
+            parsed = None
+        except OSError as e:
+            result_queue.put(("error", worker_id, str(e)))
+            break
+        now = time.time()
+        if parsed is not None:
+            seen += 1
+            src, dst, src_port, dest_port, protocol, ip_length = parsed
+            if not ports or dest_port in ports:
+                if sampler is None or sampler.mode == "count" or sampler.sample((src, dst, src_port, dest_port)):
+                    flow_table.update((src, dst, src_port, dest_port, protocol), ip_length, now,
+                                      sampler.rate if sampler else 1)
+        if now - last_flush >= batch_interval:
+            batch = _build_batch(flow_table.collect(now), filter_internal_ip, internal_cache)
+            result_queue.put(("batch", worker_id, batch, sampler.rate if sampler else 1, seen))
+            last_flush = now
+    sock.close()
+    batch = _build_batch(flow_table.flush(), filter_internal_ip, internal_cache)
+    result_queue.put(("batch", worker_id, batch, sampler.rate if sampler else 1, seen))
+
+
+class FanoutNetworkMonitor(BaseMonitor):
+    """
+    多进程网卡监控：在同一网卡上启动多个抓包进程，通过 PACKET_FANOUT 按流分流，
+    不依赖 scapy，也不与主进程争用 GIL（仅支持 Linux）
+    """
+
+    def __init__(self, interface: str, workers: int, interval: int = 5, ports: Optional[Set[int]] = None,
+                 filter_internal_ip: bool = False, packet_queue=None, sampling: Optional[Dict] = None,
+                 flows: Optional[Dict] = None, batch_interval: float = 1.0):
+        """
+        Args:
+            interface: 网卡名称
+            workers: 抓包进程数
+            interval: 与 NetworkMonitor 一致，这里用于主进程读取批次的超时
+            ports: 监控的目的端口，默认全部
+            filter_internal_ip: 是否过滤内网源地址
+            packet_queue: 输出队列
+            sampling: 每个进程的采样配置，预算按进程计算
+            flows: 每个进程的流表配置，见 FlowTable
+            batch_interval: 工作进程发送批次的间隔（秒）
+        """
+        if not hasattr(socket, "AF_PACKET"):
+            raise ValueError("Fan-out capture requires Linux AF_PACKET sockets")
+        try:
+            socket.if_nametoindex(interface)
+        except OSError:
+            raise ValueError(f"Interface {interface} not found")
+        super().__init__(packet_queue)
+        self.interface = interface
+        self.workers = workers
+        self.interval = interval
+        # 与 NetworkMonitor 相同，80 和 443 由 Nginx 日志覆盖
+        self.ports = {port for port in ports if port not in {80, 443}} if ports else set()
+        self.filter_internal_ip = filter_internal_ip
+        self.sampling = sampling
+        self.flows = flows
+        self.batch_interval = batch_interval
+        self.group_id = (os.getpid() ^ socket.if_nametoindex(interface)) & 0xFFFF
+        self.context = multiprocessing.get_context("spawn")
+        self.result_queue = None
+        self.stop_event = None
+        self.processes: List = []
+        self.worker_stats: Dict[int, Dict] = {}
+
+    def _collect(self) -> None:
+        """从工作进程读取批次并写入输出队列"""
+        while self.is_running:
+            try:
+                message = self.result_queue.get(timeout=self.interval)
+            except queue.Empty:
+                continue
+            if message[0] == "error":
+                logger.error(f"Capture worker {message[1]} on {self.interface} failed: {message[2]}")
+                continue
+            _, worker_id, batch, rate, seen = message
+            self.worker_stats[worker_id] = {'sample_rate': rate, 'seen': seen}
+            if batch:
+                self.packet_queue.put({self.interface: flow_records(batch, self.interface)})
+
+    def start(self) -> None:
+        if not self.is_running:
+            self.result_queue = self.context.Queue()
+            self.stop_event = self.context.Event()
+            for worker_id in range(self.workers):
+                process = self.context.Process(
+                    target=capture_worker,
+                    args=(worker_id, self.interface, self.group_id, self.ports, self.filter_internal_ip,
+                          self.sampling, self.flows, self.batch_interval, self.result_queue, self.stop_event),
+                    name=f"capture-{self.interface}-{worker_id}",
+                    daemon=True,
+                )
+                process.start()
+                self.processes.append(process)
+            self.is_running = True
+            self.thread = threading.Thread(target=self._collect, name=f"fanout-{self.interface}")
+            self.thread.daemon = True
+            self.thread.start()
+            logger.info(f"Fan-out monitor started on interface: {self.interface} with {self.workers} workers")
+
+    def stop(self) -> None:
+        if self.is_running:
+            self.stop_event.set()
+            for process in self.processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            self.is_running = False
+            if self.thread:
+                self.thread.join()
+            # 取出进程退出前发送的最后一批
+            while True:
+                try:
+                    message = self.result_queue.get(timeout=0.5)
+                except queue.Empty:
+                    break
+                if message[0] == "batch" and message[2]:
+                    self.packet_queue.put({self.interface: flow_records(message[2], self.interface)})
+            self.processes = []
+            logger.info(f"Fan-out monitor stopped on interface: {self.interface}")
+
+    def stats(self) -> Dict:
+        rates = [worker['sample_rate'] for worker in self.worker_stats.values()]
+        return {
+            'interface': self.interface,
+            'workers': self.workers,
+            'alive': sum(1 for process in self.processes if process.is_alive()),
+            'seen': sum(worker['seen'] for worker in self.worker_stats.values()),
+            'sample_rate': max(rates) if rates else 1,
+        }
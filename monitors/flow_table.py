@@ -0,0 +1,108 @@
+import time
+from collections import OrderedDict
+from typing import List, Tuple
+
+class FlowTable:
+    """
+    有界流表
+
+    按五元组 (src_ip, dest_ip, src_port, dest_port, protocol) 累计包数、字节数和首末包时间，
+    参照 NetFlow 在以下情况导出流记录：
+    - 空闲超时：idle_timeout 秒内没有新包
+    - 活动超时：流持续超过 active_timeout 秒，导出后从下一个包重新计数
+    - 流表压力：条目数达到 max_flows 时导出最久未更新的流
+    流表按最后更新时间排序，空闲检查只需从表头开始，每个包的开销为 O(1)。
+    """
+
+    def __init__(self, max_flows: int = 65536, idle_timeout: float = 10, active_timeout: float = 30):
+        """
+        Args:
+            max_flows: 流表最大条目数
+            idle_timeout: 空闲超时（秒）
+            active_timeout: 活动超时（秒），长连接按此间隔分段导出
+        """
+        if max_flows <= 0 or idle_timeout <= 0 or active_timeout <= 0:
+            raise ValueError("Flow table limits must be positive")
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.flows: OrderedDict = OrderedDict()  # key -> [包数, 字节数, 首包时间, 末包时间]
+        self.exported: List[Tuple] = []
+        self.packets = 0
+        self.evicted = 0
+
+    def update(self, key: tuple, length: int, now: float, rate: int = 1) -> None:
+        """记录一个包；rate 为该包被采样时的采样率，包数和字节数按其加权还原"""
+        self.packets += 1
+        length *= rate
+        flows = self.flows
+        entry = flows.get(key)
+        if entry is not None:
+            if now - entry[2] >= self.active_timeout:
+                del flows[key]
+                self.exported.append((key, *entry))
+            else:
+                entry[0] += rate
+                entry[1] += length
+                entry[3] = now
+                flows.move_to_end(key)
+                return
+        elif len(flows) >= self.max_flows:
+            old_key, old_entry = flows.popitem(last=False)
+            self.exported.append((old_key, *old_entry))
+            self.evicted += 1
+        flows[key] = [rate, length, now, now]
+
+    def collect(self, now: float) -> List[Tuple]:
+        """
+        导出空闲超时的流以及此前因活动超时或流表压力导出的流
+
+        Returns:
+            [(key, 包数, 字节数, 首包时间, 末包时间), ...]
+        """
+        flows = self.flows
+        cutoff = now - self.idle_timeout
+        while flows:
+            key, entry = next(iter(flows.items()))
+            if entry[3] > cutoff:
+                break
+            del flows[key]
+            self.exported.append((key, *entry))
+        exported, self.exported = self.exported, []
+        return exported
+
+    def flush(self) -> List[Tuple]:
+        """导出全部流，停止抓包时调用"""
+        exported = self.exported
+        exported.extend((key, *entry) for key, entry in self.flows.items())
+        self.flows = OrderedDict()
+        self.exported = []
+        return exported
+
+    def stats(self) -> dict:
+        return {'active_flows': len(self.flows), 'flow_packets': self.packets, 'flow_evictions': self.evicted}
+
+
+def flow_records(flows: List[Tuple], interface: str) -> List[dict]:
+    """
+    将导出的流转换为记录，timestamp 为首包时间
+
+    packets/bytes 已在 FlowTable.update 中按每个包的采样率还原，sample_rate 固定为 1，
+    避免导出时的采样率套用到此前按其他采样率取到的包上
+    """
+    records = []
+    for (src_ip, dest_ip, src_port, dest_port, protocol), packets, length, first_seen, last_seen in flows:
+        records.append({
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(first_seen)),
+            'src_ip': src_ip,
+            'src_port': src_port,
+            'dest_ip': dest_ip,
+            'dest_port': dest_port,
+            'protocol': protocol,
+            'interface': interface,
+            'packets': packets,
+            'bytes': length,
+            'last_seen': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_seen)),
+            'sample_rate': 1,
+        })
+    return records
@@ -1,51 +1,145 @@
-from monitors.network_monitor import NetworkMonitor
-from monitors.nginx_log_monitor import NginxLogMonitor
-from typing import List, Dict, Optional, Set
+import importlib
+from typing import List, Dict, Optional, Set, Tuple, Type
 import logging
 
+from monitors.base_monitor import BaseMonitor
+
 logger = logging.getLogger(__name__)
 
 class MonitorFactory:
-    """工厂类，用于创建监控器实例"""
+    """
+    工厂类，用于创建监控器实例
+
+    监控器按类型名注册，实现模块在首次创建该类型时才导入，未配置网卡监控时不会加载 scapy。
+    配置中 monitors 条目的 type 可以是已注册的类型名，也可以是 "模块路径:类名" 形式的自定义监控器。
+    """
+
+    _registry: Dict[str, Tuple[str, str]] = {
+        "network": ("monitors.network_monitor", "NetworkMonitor"),
+        "network_fanout": ("monitors.fanout_monitor", "FanoutNetworkMonitor"),
+        "nginx": ("monitors.nginx_log_monitor", "NginxLogMonitor"),
+    }
+
+    @classmethod
+    def register(cls, type_name: str, module_path: str, class_name: str) -> None:
+        """注册监控器类型，实现模块在首次使用时导入"""
+        cls._registry[type_name] = (module_path, class_name)
+
+    @classmethod
+    def get_monitor_class(cls, type_name: str) -> Type[BaseMonitor]:
+        if type_name in cls._registry:
+            module_path, class_name = cls._registry[type_name]
+        elif ":" in type_name:
+            module_path, class_name = type_name.split(":", 1)
+        else:
+            raise ValueError(f"Unknown monitor type: {type_name}")
+        try:
+            monitor_class = getattr(importlib.import_module(module_path), class_name)
+        except (ImportError, AttributeError) as e:
+            raise ValueError(f"Failed to load monitor type {type_name}: {e}")
+        if not issubclass(monitor_class, BaseMonitor):
+            raise ValueError(f"Monitor type {type_name} must inherit BaseMonitor")
+        return monitor_class
 
     @staticmethod
     def create_network_monitor(interface: str, interval: int = 5, ports: Optional[Set[int]] = None,
-                              filter_internal_ip: bool = False) -> NetworkMonitor:
-        try:
-            monitor = NetworkMonitor(interface, interval, ports, filter_internal_ip)
-            logger.info(f"Created network monitor for {interface}")
-            return monitor
-        except ValueError as e:
-            logger.error(f"Failed to create network monitor: {e}")
-            raise
+                              filter_internal_ip: bool = False, packet_queue=None,
+                              sampling: Optional[Dict] = None, flows: Optional[Dict] = None) -> BaseMonitor:
+        return MonitorFactory._create("network", {
+            "interface": interface, "interval": interval, "ports": ports,
+            "filter_internal_ip": filter_internal_ip, "sampling": sampling, "flows": flows,
+        }, packet_queue)
 
     @staticmethod
-    def create_nginx_log_monitor(logs_dir: str, interval: int = 5,logrotate: bool = False,) -> NginxLogMonitor:
+    def create_fanout_network_monitor(interface: str, workers: int, interval: int = 5,
+                                      ports: Optional[Set[int]] = None, filter_internal_ip: bool = False,
+                                      packet_queue=None, sampling: Optional[Dict] = None,
+                                      flows: Optional[Dict] = None) -> BaseMonitor:
+        return MonitorFactory._create("network_fanout", {
+            "interface": interface, "workers": workers, "interval": interval, "ports": ports,
+            "filter_internal_ip": filter_internal_ip, "sampling": sampling, "flows": flows,
+        }, packet_queue)
+
+    @staticmethod
+    def create_nginx_log_monitor(logs_dir: str, interval: int = 5,logrotate: bool = False,
+                                 packet_queue=None) -> BaseMonitor:
+        return MonitorFactory._create("nginx", {
+            "logs_dir": logs_dir, "interval": interval, "logrotate": logrotate,
+        }, packet_queue)
+
+    @staticmethod
+    def _create(type_name: str, options: Dict, packet_queue=None) -> BaseMonitor:
         try:
-            monitor = NginxLogMonitor(logs_dir, interval,logrotate)
-            logger.info(f"Created Nginx log monitor for {logs_dir}")
+            monitor = MonitorFactory.get_monitor_class(type_name)(packet_queue=packet_queue, **options)
+            logger.info(f"Created {type_name} monitor: {options}")
             return monitor
         except ValueError as e:
-            logger.error(f"Failed to create Nginx log monitor: {e}")
+            logger.error(f"Failed to create {type_name} monitor: {e}")
             raise
 
     @staticmethod
-    def create_monitors_from_config(config: Dict, filter_internal_ip: bool = False) -> List:
-        monitors = []
-        # 创建网卡监控器
+    def build_monitor_specs(config: Dict, filter_internal_ip: bool = False) -> Dict[str, Dict]:
+        """
+        根据配置生成监控器描述
+
+        Returns:
+            以监控器标识为键、{"type": 类型名, "options": 创建参数} 为值的字典，
+            热重载时通过对比描述判断监控器是否需要重建
+        """
+        specs = {}
         if config.get("monitors", []) is not None:
             for monitor_config in config.get("monitors", []):
-                interface = monitor_config["interface"]
-                interval = monitor_config.get("interval", 5)
-                ports = set(monitor_config.get("ports", [])) if monitor_config.get("ports") else None
-                monitor = MonitorFactory.create_network_monitor(interface, interval, ports, filter_internal_ip)
-                monitors.append(monitor)
-        # 创建Nginx日志监控器
+                monitor_type = monitor_config.get("type", "network")
+                if monitor_type == "network":
+                    # 网卡监控器
+                    interface = monitor_config["interface"]
+                    options = {
+                        "interface": interface,
+                        "interval": monitor_config.get("interval", 5),
+                        "ports": sorted(monitor_config["ports"]) if monitor_config.get("ports") else None,
+                        "filter_internal_ip": filter_internal_ip,
+                        "sampling": monitor_config.get("sampling"),
+                        "flows": monitor_config.get("flows"),
+                    }
+                    workers = monitor_config.get("workers", 1)
+                    if workers > 1:
+                        monitor_type = "network_fanout"
+                        options["workers"] = workers
+                    specs[f"network:{interface}"] = {"type": monitor_type, "options": options}
+                else:
+                    # 自定义监控器，除 type 和 name 外的配置项作为创建参数
+                    options = {key: value for key, value in monitor_config.items() if key not in ("type", "name")}
+                    name = monitor_config.get("name") or monitor_type
+                    specs[f"{monitor_type}:{name}"] = {"type": monitor_type, "options": options}
+        # Nginx日志监控器
         middleware_config = config.get("middleware", {})
         if middleware_config.get("type") == "nginx":
             logs_dir = middleware_config.get("logs_dir", "/var/log/nginx")
-            interval = 5  # 默认值，可在middleware中添加interval字段
-            logrotate = middleware_config.get("logrotate", False)
-            monitor = MonitorFactory.create_nginx_log_monitor(logs_dir, interval,logrotate)
-            monitors.append(monitor)
-        return monitors
\ No newline at end of file
+            specs[f"nginx:{logs_dir}"] = {
+                "type": "nginx",
+                "options": {
+                    "logs_dir": logs_dir,
+                    "interval": 5,  # 默认值，可在middleware中添加interval字段
+                    "logrotate": middleware_config.get("logrotate", False),
+                },
+            }
+        return specs
+
+    @staticmethod
+    def create_monitor(spec: Dict, packet_queue=None) -> BaseMonitor:
+        """
+        根据 build_monitor_specs 生成的描述创建监控器
+
+        Args:
+            spec: 监控器描述
+            packet_queue: 监控器输出队列，默认为监控器自己的内存队列
+        """
+        options = dict(spec["options"])
+        if options.get("ports"):
+            options["ports"] = set(options["ports"])
+        return MonitorFactory._create(spec["type"], options, packet_queue)
+
+    @staticmethod
+    def create_monitors_from_config(config: Dict, filter_internal_ip: bool = False) -> List[BaseMonitor]:
+        specs = MonitorFactory.build_monitor_specs(config, filter_internal_ip)
+        return [MonitorFactory.create_monitor(spec) for spec in specs.values()]
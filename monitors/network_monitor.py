@@ -3,24 +3,33 @@ import threading
 import time
 import logging
 import ipaddress
-import queue
-from typing import Optional, Set
+from typing import Optional, Set, Dict
+from monitors.base_monitor import BaseMonitor
+from monitors.sampling import AdaptiveSampler
+from monitors.flow_table import FlowTable, flow_records
 
 logger = logging.getLogger(__name__)
 
-class NetworkMonitor:
-    """网络流量监控类，仅捕获网卡流量"""
+class NetworkMonitor(BaseMonitor):
+    """
+    网络流量监控类，仅捕获网卡流量
+
+    包在抓包线程内按五元组汇入流表，每个抓包周期结束时导出已结束的流，输出队列中每条记录对应一个流。
+    """
 
     def __init__(self, interface: str, interval: int = 5, ports: Optional[Set[int]] = None,
-                 filter_internal_ip: bool = False):
+                 filter_internal_ip: bool = False, packet_queue=None, sampling: Optional[Dict] = None,
+                 flows: Optional[Dict] = None):
+        super().__init__(packet_queue)
         self.interface = interface
         self.interval = interval
         self.ports = self._filter_ports(ports)
         self.filter_internal_ip = filter_internal_ip
-        self.is_running = False
-        self.thread = None
-        self.packet_queue = queue.Queue()
         self.mac_address = self._get_mac_address()
+        # 流量超过预算时自适应采样，流表按采样率还原计数；scapy 在回调前已完成解析，采样只减少后续处理的开销
+        self.sampler = AdaptiveSampler(**sampling) if sampling else None
+        # 流表仅在抓包线程内访问
+        self.flow_table = FlowTable(**(flows or {}))
 
         if interface not in get_if_list():
             raise ValueError(f"Interface {interface} not found. Available interfaces: {get_if_list()}")
@@ -49,19 +58,12 @@ class NetworkMonitor:
 
     def _packet_handler(self, packet):
         try:
+            sampler = self.sampler
+            if sampler and sampler.mode == "count" and not sampler.sample():
+                return
             if packet.haslayer('Ether') and packet.haslayer('IP'):
-                eth = packet.getlayer('Ether')
                 ip = packet.getlayer('IP')
                 src_port = dest_port = 0
-                packet_info = {
-                    'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(packet.time)),
-                    'src_ip': ip.src,
-                    # 'dest_ip': ip.dst,
-                    # 'src_mac': eth.src,
-                    # 'dest_mac': eth.dst,
-                    'interface': self.interface
-                }
-
                 if packet.haslayer('TCP'):
                     tcp = packet.getlayer('TCP')
                     src_port, dest_port = tcp.sport, tcp.dport
@@ -69,18 +71,22 @@ class NetworkMonitor:
                     udp = packet.getlayer('UDP')
                     src_port, dest_port = udp.sport, udp.dport
 
-                packet_info['src_port'] = src_port
-                # packet_info['dest_port'] = dest_port
-
+                if sampler and sampler.mode == "flow" and not sampler.sample((ip.src, ip.dst, src_port, dest_port)):
+                    return
                 if self.ports and dest_port not in self.ports:
                     return
                 if self.filter_internal_ip and self._is_internal_ip(ip.src):
                     return
 
-                self.packet_queue.put({self.interface: [packet_info]})
+                self.flow_table.update((ip.src, ip.dst, src_port, dest_port, ip.proto), ip.len, float(packet.time),
+                                       sampler.rate if sampler else 1)
         except Exception as e:
             logger.error(f"Error processing packet: {e}")
 
+    def _export_flows(self, flows) -> None:
+        if flows:
+            self.packet_queue.put({self.interface: flow_records(flows, self.interface)})
+
     def _monitor(self):
         logger.info(f"Starting monitoring on {self.interface} with ports: {self.ports if self.ports else 'all'}")
         filter_str = f"port {' or '.join(map(str, self.ports))}" if self.ports else ""
@@ -89,11 +95,13 @@ class NetworkMonitor:
                 sniff(iface=self.interface, filter=filter_str, prn=self._packet_handler, store=0, timeout=self.interval)
             except Exception as e:
                 logger.error(f"Error in monitoring {self.interface}: {e}")
+            self._export_flows(self.flow_table.collect(time.time()))
+        self._export_flows(self.flow_table.flush())
 
     def start(self) -> None:
         if not self.is_running:
             self.is_running = True
-            self.thread = threading.Thread(target=self._monitor)
+            self.thread = threading.Thread(target=self._monitor, name=f"monitor-{self.interface}")
             self.thread.daemon = True
             self.thread.start()
             logger.info(f"Monitor started on interface: {self.interface}")
@@ -105,5 +113,9 @@ class NetworkMonitor:
                 self.thread.join()
             logger.info(f"Monitor stopped on interface: {self.interface}")
 
-    def get_packet_queue(self) -> queue.Queue:
-        return self.packet_queue
\ No newline at end of file
+    def stats(self) -> Dict:
+        """运行统计，包括当前生效的采样率"""
+        stats = {'interface': self.interface, 'sample_rate': 1, **self.flow_table.stats()}
+        if self.sampler:
+            stats.update(self.sampler.stats())
+        return stats
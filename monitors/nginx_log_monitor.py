@@ -2,23 +2,44 @@ import os
 import re
 import threading
 import time
-import queue
 from datetime import datetime
 from typing import Dict, List
 import logging
 from pathlib import Path
+from monitors.base_monitor import BaseMonitor
 
 logger = logging.getLogger(__name__)
 
-class NginxLogMonitor:
+# custom 日志格式；第 2 版在末尾追加 $request_time 和 $upstream_response_time，两种格式都可解析
+NGINX_LOG_PATTERN = re.compile(
+    r'(\S+)\|(\S+)\|\[([^]]+)\]\|([^|]+)\|(\d+\s+\d+)\|"([^"]*)"\|\[UA\]([^|]+)\[UA\]\|([^|\s]+)\|([^|\s]+)'
+    r'(?:\|([^|\s]+)\|(.*))?'
+)
+
+
+def parse_upstream_time(value: str):
+    """
+    解析 $upstream_response_time，多次尝试上游时为 "0.010, 0.020" 或 "0.010 : 0.020"，取总和；
+    未经过上游时为 "-"，返回 None
+    """
+    total = None
+    for part in value.replace(':', ',').split(','):
+        part = part.strip()
+        if part and part != '-':
+            try:
+                total = (total or 0.0) + float(part)
+            except ValueError:
+                continue
+    return total
+
+class NginxLogMonitor(BaseMonitor):
     """Nginx日志监控类，解析日志并生成流量数据"""
 
-    def __init__(self, logs_dir: str, interval: int = 5, logrotate: bool = False,last_log_time: datetime = None):
+    def __init__(self, logs_dir: str, interval: int = 5, logrotate: bool = False,last_log_time: datetime = None,
+                 packet_queue=None):
+        super().__init__(packet_queue)
         self.logs_dir = logs_dir
         self.interval = interval
-        self.packet_queue = queue.Queue()
-        self.is_running = False
-        self.thread = None
         self.logrotate = logrotate
         self.log_files = self._collect_log_files()
         self.last_log_time = last_log_time or datetime.now().astimezone()
@@ -49,6 +70,7 @@ class NginxLogMonitor:
         for log_file in self.log_files:
             if not os.path.exists(log_file):
                 continue
+            site = os.path.basename(log_file)[:-len(".log")]
             try:
                 with open(log_file, 'r', encoding='utf-8') as f:
                     lines = f.readlines()
@@ -58,12 +80,10 @@ class NginxLogMonitor:
                         line = line.strip()
                         if not line:
                             continue
-                        match = re.match(
-                            r'(\S+)\|(\S+)\|\[([^]]+)\]\|([^|]+)\|(\d+\s+\d+)\|"([^"]*)"\|\[UA\]([^|]+)\[UA\]\|(\S+)\|(\S+)',
-                            line
-                        )
+                        match = NGINX_LOG_PATTERN.match(line)
                         if match:
-                            remote_addr,remote_port, time_local, request, status_bytes, referer, user_agent,ip,port = match.groups()
+                            remote_addr,remote_port, time_local, request, status_bytes, referer, user_agent,ip,port, \
+                                request_time, upstream_time = match.groups()
                             status, body_bytes = status_bytes.split()
                             log_time = datetime.strptime(time_local, '%d/%b/%Y:%H:%M:%S %z')
                             # print(log_time,self.last_log_time,current_time)
@@ -85,7 +105,18 @@ class NginxLogMonitor:
                                 'interface': "nginx",
                                 'url': request,
                                 'user_agent': user_agent,
+                                'status': int(status),
+                                'body_bytes': int(body_bytes),
+                                'site': site,
                             }
+                            if request_time is not None:
+                                try:
+                                    packet_info['request_time'] = float(request_time)
+                                except ValueError:
+                                    pass
+                                upstream = parse_upstream_time(upstream_time)
+                                if upstream is not None:
+                                    packet_info['upstream_time'] = upstream
                             self.packet_queue.put({"nginx": [packet_info]})
                         else:
                             logger.debug(f"Line in {log_file} did not match expected format: {line[:50]}...")
@@ -106,7 +137,7 @@ class NginxLogMonitor:
     def start(self) -> None:
         if not self.is_running:
             self.is_running = True
-            self.thread = threading.Thread(target=self._monitor)
+            self.thread = threading.Thread(target=self._monitor, name="monitor-nginx")
             self.thread.daemon = True
             self.thread.start()
             logger.info("Nginx log monitor started")
@@ -118,5 +149,5 @@ class NginxLogMonitor:
                 self.thread.join()
             logger.info("Nginx log monitor stopped")
 
-    def get_packet_queue(self) -> queue.Queue:
-        return self.packet_queue
\ No newline at end of file
+    def stats(self) -> Dict:
+        return {'log_files': len(self.log_files), 'last_log_time': str(self.last_log_time)}
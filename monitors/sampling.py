@@ -0,0 +1,75 @@
+import math
+import time
+from typing import Dict
+
+class AdaptiveSampler:
+    """
+    自适应采样器
+
+    按统计周期测量到达速率，超过预算时切换为 1/N 采样：count 模式按顺序每 N 个取 1 个，
+    flow 模式按五元组哈希取样，同一连接的包要么全部保留要么全部丢弃。周期内保留的包数一旦超过
+    budget * window 就按已观测到的速率立即提高采样率，不等周期结束；每个周期结束时按整个周期的
+    到达速率重新计算采样率，速率回落后自动恢复全量处理。
+    """
+
+    MODES = ("count", "flow")
+
+    def __init__(self, budget: int, mode: str = "count", window: float = 1.0, max_rate: int = 1024):
+        """
+        Args:
+            budget: 每秒完整处理的包数上限
+            mode: 采样方式，count 或 flow
+            window: 速率统计周期（秒）
+            max_rate: 采样率上限，即最多每 max_rate 个包取 1 个
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported sampling mode {mode}, must be one of {self.MODES}")
+        self.budget = budget
+        self.mode = mode
+        self.window = window
+        self.max_rate = max_rate
+        self.window_budget = max(1, int(budget * window))
+        self.rate = 1
+        self.seen = 0
+        self.kept = 0
+        self.window_seen = 0
+        self.window_kept = 0
+        self.window_start = time.monotonic()
+        self.counter = 0
+
+    def _rate_for(self, seen: int, elapsed: float) -> int:
+        return min(self.max_rate, max(1, math.ceil(seen / max(elapsed, 1e-6) / self.budget)))
+
+    def _check(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.window_start
+        if elapsed >= self.window:
+            # 周期结束：按整个周期的到达速率重新计算，速率回落时恢复
+            self.rate = self._rate_for(self.window_seen, elapsed)
+            self.window_seen = 0
+            self.window_kept = 0
+            self.window_start = now
+        elif self.window_kept >= self.window_budget and self.rate < self.max_rate:
+            # 周期未结束已用完预算：立即按目前观测到的速率提高采样率，至少翻倍
+            self.rate = min(self.max_rate, max(self.rate * 2, self._rate_for(self.window_seen, elapsed)))
+            self.window_kept = 0
+
+    def sample(self, flow_key=None) -> bool:
+        """返回该包是否保留；flow 模式需要传入五元组"""
+        self.seen += 1
+        self.window_seen += 1
+        self._check()
+        if self.rate == 1:
+            keep = True
+        elif self.mode == "flow" and flow_key is not None:
+            keep = hash(flow_key) % self.rate == 0
+        else:
+            self.counter += 1
+            keep = self.counter % self.rate == 0
+        if keep:
+            self.kept += 1
+            self.window_kept += 1
+        return keep
+
+    def stats(self) -> Dict:
+        return {"sample_rate": self.rate, "seen": self.seen, "kept": self.kept, "mode": self.mode}
@@ -3,10 +3,18 @@ import sys
 import subprocess
 from functions import *
 
+# custom 日志格式的各个版本，新版本只在末尾追加字段，旧版本的日志仍可解析
+LOG_FORMATS = {
+    1: 'log_format custom \'$remote_addr|$remote_port|[$time_local]|$scheme://$http_host$request_uri|$status $body_bytes_sent|"$http_referer"|[UA]$http_user_agent[UA]|$server_addr|$server_port\'',
+    # 第 2 版增加请求耗时与上游响应耗时（秒）
+    2: 'log_format custom \'$remote_addr|$remote_port|[$time_local]|$scheme://$http_host$request_uri|$status $body_bytes_sent|"$http_referer"|[UA]$http_user_agent[UA]|$server_addr|$server_port|$request_time|$upstream_response_time\'',
+}
 
 def main():
     parser = argparse.ArgumentParser(description="Nginx 适配初始化程序")
     parser.add_argument('--config', type=str, required=True, help="Path to the config file")
+    parser.add_argument('--log-format-version', type=int, choices=sorted(LOG_FORMATS),
+                        help="custom 日志格式版本，默认取配置中的 middleware.log_format_version（未配置时为 1）")
     args = parser.parse_args()
 
     # 读取 YAML 配置
@@ -17,7 +25,10 @@ def main():
     nginx_setting = config['middleware']
     nginx_conf_path = nginx_setting['config']
     sites_dir = nginx_setting['sites_dir']
-    expected_log_format = 'log_format custom \'$remote_addr|$remote_port|[$time_local]|$scheme://$http_host$request_uri|$status $body_bytes_sent|"$http_referer"|[UA]$http_user_agent[UA]|$server_addr|$server_port\''
+    log_format_version = args.log_format_version or nginx_setting.get('log_format_version', 1)
+    if log_format_version not in LOG_FORMATS:
+        raise Exception(f"不支持的日志格式版本: {log_format_version}")
+    expected_log_format = LOG_FORMATS[log_format_version]
 
     # 验证 Nginx 是否安装
     if not verify_nginx():
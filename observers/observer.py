@@ -52,7 +52,7 @@ class TrafficObserver:
     def start(self) -> None:
         if not self.is_running:
             self.is_running = True
-            self.thread = threading.Thread(target=self._observe)
+            self.thread = threading.Thread(target=self._observe, name="observer")
             self.thread.daemon = True
             self.thread.start()
             logger.info("Observer started")
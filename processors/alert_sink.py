@@ -0,0 +1,98 @@
+import os
+import json
+import queue
+import threading
+import subprocess
+import urllib.request
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+class AlertSink:
+    """告警输出基类，告警在后台线程中发送，不阻塞主循环"""
+
+    def __init__(self, max_pending: int = 10000):
+        self.alert_queue = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name=f"alert-{type(self).__name__}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def emit(self, alert: Dict) -> None:
+        try:
+            self.alert_queue.put_nowait(alert)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            alert = self.alert_queue.get()
+            if alert is None:
+                break
+            try:
+                self._send(alert)
+            except Exception as e:
+                logger.error(f"Failed to send alert {alert.get('rule')}: {e}")
+
+    def _send(self, alert: Dict) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.alert_queue.put(None)
+        self.thread.join()
+        if self.dropped:
+            logger.warning(f"{type(self).__name__} dropped {self.dropped} alerts")
+
+
+class FileAlertSink(AlertSink):
+    """将告警按行追加到 JSON Lines 文件"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        super().__init__()
+
+    def _send(self, alert: Dict) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(alert, ensure_ascii=False) + "\n")
+
+
+class WebhookAlertSink(AlertSink):
+    """将告警以 JSON 格式 POST 到指定地址"""
+
+    def __init__(self, url: str, timeout: int = 5):
+        self.url = url
+        self.timeout = timeout
+        super().__init__()
+
+    def _send(self, alert: Dict) -> None:
+        request = urllib.request.Request(self.url, data=json.dumps(alert).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class CommandAlertSink(AlertSink):
+    """执行指定命令，告警以 JSON 格式写入命令的标准输入"""
+
+    def __init__(self, command: str, timeout: int = 10):
+        self.command = command
+        self.timeout = timeout
+        super().__init__()
+
+    def _send(self, alert: Dict) -> None:
+        subprocess.run(self.command, shell=True, input=json.dumps(alert).encode('utf-8'),
+                       stdout=subprocess.DEVNULL, timeout=self.timeout, check=True)
+
+
+def create_alert_sink(config: Dict, default_path: str) -> AlertSink:
+    """根据 alerts 配置创建告警输出，默认写入记录目录下的 alerts.jsonl"""
+    sink_type = (config or {}).get('type', 'file')
+    if sink_type == 'file':
+        return FileAlertSink((config or {}).get('path') or os.path.join(default_path, "alerts.jsonl"))
+    if sink_type == 'webhook':
+        return WebhookAlertSink(config['url'], config.get('timeout', 5))
+    if sink_type == 'command':
+        return CommandAlertSink(config['command'], config.get('timeout', 10))
+    raise ValueError(f"Unsupported alert sink type: {sink_type}")
@@ -0,0 +1,39 @@
+import time
+from datetime import datetime
+from typing import List, Dict
+
+class RecordProcessor:
+    """记录处理阶段基类，写入前按顺序处理每批记录"""
+
+    def process(self, packets: List[Dict]) -> List[Dict]:
+        """处理同一来源（网卡或nginx）的一批记录，返回交给下一阶段的记录"""
+        return packets
+
+    def tick(self) -> None:
+        """每轮主循环调用一次，用于按时间输出结果或清理过期状态"""
+
+    def stats(self) -> Dict:
+        return {}
+
+    def close(self) -> None:
+        """停止时调用，输出剩余结果并释放资源"""
+
+
+class TimestampParser:
+    """将记录中的 '%Y-%m-%d %H:%M:%S' 时间戳转换为秒级时间戳，缓存最近的转换结果"""
+
+    def __init__(self, max_cache: int = 4096):
+        self.max_cache = max_cache
+        self.cache: Dict[str, int] = {}
+
+    def __call__(self, text: str) -> int:
+        value = self.cache.get(text)
+        if value is None:
+            try:
+                value = int(time.mktime(datetime.strptime(text, "%Y-%m-%d %H:%M:%S").timetuple()))
+            except (TypeError, ValueError):
+                return int(time.time())
+            if len(self.cache) >= self.max_cache:
+                self.cache.clear()
+            self.cache[text] = value
+        return value
@@ -0,0 +1,324 @@
+"""
+IP / CIDR 黑名单匹配
+
+黑名单预先编译为一个文件，运行时以 mmap 只读映射，启动不需要解析原始列表：
+    python -m processors.blocklist -o /var/lib/ezmonitor/blocklist.bin lists/*.txt
+
+原始列表每行一个 IP 或 CIDR，# 之后为注释。重新编译时先写临时文件再替换，运行中的程序检测到文件变化后自动重新映射。
+"""
+import os
+import sys
+import mmap
+import array
+import socket
+import struct
+import logging
+import argparse
+import ipaddress
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Iterable, Optional, Sequence
+
+from processors.base import RecordProcessor
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"EZBL"
+VERSION = 1
+# magic, 版本, 字节序, 哈希函数个数, Bloom 位数, IPv4 精确条目数, IPv6 精确条目数, IPv4 区间数, IPv6 区间数
+HEADER = struct.Struct("<4sHBBQQQQQ")
+BYTE_ORDERS = {"little": 0, "big": 1}
+MASK64 = 0xFFFFFFFFFFFFFFFF
+IPV6_TAG = 1 << 128  # 区分 IPv4 与 IPv4 映射的 IPv6 地址
+
+
+def _bloom_hash(key: int):
+    """由整数地址生成双重哈希的两个基值；int 的 hash 不随进程随机化，编译与运行时结果一致"""
+    mixed = (hash(key) * 0x9E3779B97F4A7C15) & MASK64
+    return mixed >> 32, (mixed & 0xFFFFFFFF) | 1
+
+
+def _padded(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _search16(view: memoryview, count: int, key: bytes, right: bool = False) -> int:
+    """在按大端序排列的 16 字节键中二分查找，语义同 bisect_left / bisect_right"""
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        value = bytes(view[middle * 16:middle * 16 + 16])
+        if value < key or (right and value == key):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class Blocklist:
+    """
+    mmap 映射的黑名单
+
+    - 精确 IP：Bloom 过滤器快速排除，命中后在排序数组中二分确认
+    - CIDR：合并为互不重叠的 [起始, 结束] 区间，按起始地址排序后二分查找
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mtime = os.stat(path).st_mtime
+        view = memoryview(self.mmap)
+        self._views = [view]
+        if len(view) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is truncated ({len(view)} bytes, header needs {HEADER.size})")
+        magic, version, byte_order, hashes, bloom_bits, v4_count, v6_count, v4_ranges, v6_ranges = \
+            HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a compiled blocklist (version {VERSION})")
+        if byte_order != BYTE_ORDERS[sys.byteorder]:
+            self.close()
+            raise ValueError(f"{path} was compiled on a host with different byte order")
+        self.hashes = hashes
+        self.bloom_bits = bloom_bits
+        self.v4_count, self.v6_count = v4_count, v6_count
+        self.v4_range_count, self.v6_range_count = v4_ranges, v6_ranges
+
+        sizes = (_padded((bloom_bits + 7) // 8), v4_count * 4, v6_count * 16,
+                 v4_ranges * 4, v4_ranges * 4, v6_ranges * 16, v6_ranges * 16)
+        expected = HEADER.size + sum(_padded(size) for size in sizes)
+        if len(view) != expected:
+            # 复制到一半或被截断的文件
+            self.close()
+            raise ValueError(f"{path} has {len(view)} bytes, expected {expected} from its header")
+        offset = HEADER.size
+        sections = []
+        for size in sizes:
+            sections.append(view[offset:offset + size])
+            offset += _padded(size)
+        self._views.extend(sections)
+        self.bloom = sections[0]
+        self.v4_exact = sections[1].cast("I")
+        self.v6_exact = sections[2]
+        self.v4_starts = sections[3].cast("I")
+        self.v4_ends = sections[4].cast("I")
+        self._views.extend((self.v4_exact, self.v4_starts, self.v4_ends))
+        self.v6_starts = sections[5]
+        self.v6_ends = sections[6]
+
+    def __len__(self) -> int:
+        return self.v4_count + self.v6_count + self.v4_range_count + self.v6_range_count
+
+    def _in_bloom(self, key: int) -> bool:
+        bloom, bits = self.bloom, self.bloom_bits
+        base, step = _bloom_hash(key)
+        for i in range(self.hashes):
+            bit = (base + i * step) % bits
+            if not bloom[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def contains(self, ip: str) -> bool:
+        try:
+            if ":" in ip:
+                packed = socket.inet_pton(socket.AF_INET6, ip)
+            else:
+                packed = socket.inet_pton(socket.AF_INET, ip)
+        except (OSError, TypeError):
+            return False
+        value = int.from_bytes(packed, "big")
+        if len(packed) == 4:
+            if self.bloom_bits and self._in_bloom(value):
+                index = bisect_left(self.v4_exact, value)
+                if index < self.v4_count and self.v4_exact[index] == value:
+                    return True
+            index = bisect_right(self.v4_starts, value) - 1
+            return index >= 0 and value <= self.v4_ends[index]
+        if self.bloom_bits and self._in_bloom(value | IPV6_TAG):
+            index = _search16(self.v6_exact, self.v6_count, packed)
+            if index < self.v6_count and bytes(self.v6_exact[index * 16:index * 16 + 16]) == packed:
+                return True
+        index = _search16(self.v6_starts, self.v6_range_count, packed, right=True) - 1
+        return index >= 0 and packed <= bytes(self.v6_ends[index * 16:index * 16 + 16])
+
+    def close(self) -> None:
+        # 先释放所有视图，mmap 才能关闭
+        for view in reversed(self._views):
+            view.release()
+        self.mmap.close()
+
+
+def _merge_ranges(ranges: List[tuple]) -> List[tuple]:
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def build_blocklist(sources: Iterable[str], output: str, bits_per_entry: int = 10) -> Dict:
+    """
+    将原始列表编译为黑名单文件
+
+    Args:
+        sources: 原始列表文件
+        output: 输出文件
+        bits_per_entry: Bloom 过滤器每个精确条目占用的位数，10 位时误判率约 1%
+    """
+    v4_exact, v6_exact, v4_ranges, v6_ranges = set(), set(), [], []
+    invalid = 0
+    for source in sources:
+        with open(source, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                entry = line.split("#", 1)[0].strip()
+                if not entry:
+                    continue
+                try:
+                    if "/" not in entry:
+                        if ":" in entry:
+                            v6_exact.add(socket.inet_pton(socket.AF_INET6, entry))
+                        else:
+                            v4_exact.add(int.from_bytes(socket.inet_pton(socket.AF_INET, entry), "big"))
+                        continue
+                    network = ipaddress.ip_network(entry, strict=False)
+                except (OSError, ValueError):
+                    invalid += 1
+                    continue
+                if network.num_addresses == 1:
+                    if network.version == 4:
+                        v4_exact.add(int(network.network_address))
+                    else:
+                        v6_exact.add(network.network_address.packed)
+                elif network.version == 4:
+                    v4_ranges.append((int(network.network_address), int(network.broadcast_address)))
+                else:
+                    v6_ranges.append((int(network.network_address), int(network.broadcast_address)))
+
+    v4_ranges = _merge_ranges(v4_ranges)
+    v6_ranges = _merge_ranges(v6_ranges)
+    exact_count = len(v4_exact) + len(v6_exact)
+    bloom_bits = max(64, exact_count * bits_per_entry) if exact_count else 0
+    hashes = max(1, min(16, round(0.693 * bits_per_entry)))
+    bloom = bytearray(_padded((bloom_bits + 7) // 8))
+    keys = list(v4_exact) + [int.from_bytes(packed, "big") | IPV6_TAG for packed in v6_exact]
+    for key in keys:
+        base, step = _bloom_hash(key)
+        for i in range(hashes):
+            bit = (base + i * step) % bloom_bits
+            bloom[bit >> 3] |= 1 << (bit & 7)
+
+    sections = [
+        bytes(bloom),
+        array.array("I", sorted(v4_exact)).tobytes(),
+        b"".join(sorted(v6_exact)),
+        array.array("I", [start for start, _ in v4_ranges]).tobytes(),
+        array.array("I", [end for _, end in v4_ranges]).tobytes(),
+        b"".join(start.to_bytes(16, "big") for start, _ in v6_ranges),
+        b"".join(end.to_bytes(16, "big") for _, end in v6_ranges),
+    ]
+    temporary = f"{output}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDERS[sys.byteorder], hashes, bloom_bits,
+                            len(v4_exact), len(v6_exact), len(v4_ranges), len(v6_ranges)))
+        for section in sections:
+            f.write(section)
+            f.write(b"\0" * (_padded(len(section)) - len(section)))
+    os.replace(temporary, output)
+    return {
+        "ipv4": len(v4_exact), "ipv6": len(v6_exact), "ipv4_ranges": len(v4_ranges),
+        "ipv6_ranges": len(v6_ranges), "invalid": invalid, "bytes": os.path.getsize(output),
+    }
+
+
+class BlocklistMatcher(RecordProcessor):
+    """
+    黑名单匹配阶段
+
+    检查记录的源/目的地址，命中时在记录中加入 blocklisted 字段（值为命中的字段名）。
+    近期地址的查询结果缓存在字典中，同一地址重复出现时只需一次字典查找。
+    """
+
+    def __init__(self, path: str, fields: Sequence[str] = ("src_ip", "dest_ip"), cache_size: int = 100000):
+        """
+        Args:
+            path: 编译后的黑名单文件
+            fields: 检查的地址字段
+            cache_size: 查询结果缓存的地址数，超过后清空
+        """
+        self.path = path
+        self.fields = tuple(fields)
+        self.cache_size = cache_size
+        self.blocklist = Blocklist(path)
+        self.failed_mtime = None  # 重新加载失败的文件修改时间，避免每轮重复报错
+        self.cache: Dict[str, bool] = {}
+        self.checked = 0
+        self.matched = 0
+        logger.info(f"Loaded blocklist {path} with {len(self.blocklist)} entries")
+
+    def process(self, packets: List[Dict]) -> List[Dict]:
+        cache = self.cache
+        contains = self.blocklist.contains
+        matched = 0
+        for packet in packets:
+            tag = None
+            for field in self.fields:
+                ip = packet.get(field)
+                if not ip:
+                    continue
+                hit = cache.get(ip)
+                if hit is None:
+                    if len(cache) >= self.cache_size:
+                        cache.clear()
+                    hit = contains(ip)
+                    cache[ip] = hit
+                if hit:
+                    tag = field if tag is None else f"{tag},{field}"
+            if tag is not None:
+                packet['blocklisted'] = tag
+                matched += 1
+        self.checked += len(packets)
+        self.matched += matched
+        return packets
+
+    def tick(self) -> None:
+        """黑名单文件被重新编译后重新映射"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self.blocklist.mtime or mtime == self.failed_mtime:
+            return
+        try:
+            blocklist = Blocklist(self.path)
+        except (OSError, ValueError) as e:
+            # 继续使用旧黑名单，文件再次变化后重试
+            self.failed_mtime = mtime
+            logger.error(f"Failed to reload blocklist {self.path}: {e}")
+            return
+        old, self.blocklist = self.blocklist, blocklist
+        self.cache = {}
+        old.close()
+        logger.info(f"Reloaded blocklist {self.path} with {len(blocklist)} entries")
+
+    def stats(self) -> Dict:
+        return {'checked': self.checked, 'matched': self.matched, 'entries': len(self.blocklist)}
+
+    def close(self) -> None:
+        self.blocklist.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compile IP/CIDR blocklists for EZMonitor")
+    parser.add_argument('sources', nargs='+', help="blocklist files, one IP or CIDR per line")
+    parser.add_argument('-o', '--output', required=True, help="compiled blocklist file")
+    parser.add_argument('--bits-per-entry', type=int, default=10, help="Bloom filter bits per exact IP")
+    args = parser.parse_args(argv)
+    print(build_blocklist(args.sources, args.output, args.bits_per_entry))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import time
+import logging
+from collections import deque
+from typing import List, Dict
+
+from processors.base import RecordProcessor, TimestampParser
+from writers.writer import segment_filename, append_csv
+
+logger = logging.getLogger(__name__)
+
+class ConnectionCorrelator(RecordProcessor):
+    """
+    抓包记录与 Nginx 访问记录的关联
+
+    抓包记录按 (src_ip, src_port) 建立索引，索引项为流的首包到末包时间段，超过保留时间后按插入顺序过期；
+    Nginx 记录在允许的时间偏差内查找对应连接，匹配结果写入分段目录下的 .joined.csv。
+    暂未匹配的 Nginx 记录按到达顺序排队，抓包数据追上后从队首判定，不做全量扫描。流记录在流结束或活动超时后才导出，
+    已导出的最晚末包时间减去 capture_delay 之前的抓包数据才视为完整。
+    """
+
+    HEADERS = ['timestamp', 'src_ip', 'src_port', 'url', 'user_agent', 'capture_time', 'capture_interface',
+               'skew', 'host']
+
+    def __init__(self, path: str, interval_type: str, max_skew: int = 5, retention: int = 60,
+                 max_entries: int = 500000, max_pending: int = 100000, capture_delay: int = 0):
+        """
+        Args:
+            path: 记录目录
+            interval_type: 分段间隔，与记录器一致
+            max_skew: 允许的最大时间偏差（秒）
+            retention: 抓包索引项的保留时间（秒），需覆盖长连接上的后续请求
+            max_entries: 抓包索引最大条目数，超过时提前淘汰最旧的条目
+            max_pending: 等待匹配的 Nginx 记录上限
+            capture_delay: 抓包记录相对包时间的最大导出延迟（秒），流表为活动超时 + 空闲超时 + 导出间隔
+        """
+        self.path = path
+        self.interval_type = interval_type
+        self.max_skew = max_skew
+        self.retention = max(retention, max_skew)
+        self.max_entries = max_entries
+        self.max_pending = max_pending
+        self.capture_delay = capture_delay
+        self.index: Dict[tuple, tuple] = {}  # key -> (首包时间, 末包时间, 网卡)
+        self.expiry = deque()  # (末包时间, key)，按插入顺序过期
+        self.pending = deque()  # (Nginx记录时间, 记录)
+        self.watermark = 0  # 已处理的最新末包时间
+        self.joined: List[Dict] = []
+        self.parse_timestamp = TimestampParser()
+        self.matched = 0
+        self.unmatched = 0
+
+    @staticmethod
+    def _key(packet: Dict) -> tuple:
+        try:
+            port = int(packet.get('src_port'))
+        except (TypeError, ValueError):
+            port = 0
+        return packet.get('host'), packet.get('src_ip'), port
+
+    def _index_capture(self, packets: List[Dict]) -> None:
+        parse_timestamp = self.parse_timestamp
+        index = self.index
+        for packet in packets:
+            first = parse_timestamp(packet.get('timestamp'))
+            last_seen = packet.get('last_seen')
+            last = parse_timestamp(last_seen) if last_seen else first
+            key = self._key(packet)
+            entry = index.get(key)
+            if entry is not None and entry[0] <= first <= entry[1] + self.retention:
+                # 同一连接按活动超时分段导出的后续记录，合并为一个时间段
+                first, last = entry[0], max(last, entry[1])
+            index[key] = (first, last, packet.get('interface'))
+            self.expiry.append((last, key))
+            if last > self.watermark:
+                self.watermark = last
+
+    def _expire(self) -> None:
+        cutoff = self.watermark - self.retention
+        expiry = self.expiry
+        index = self.index
+        # 同一连接的多条抓包记录各占一个过期项，过期队列同样需要限制长度
+        max_expiry = self.max_entries * 2
+        while expiry and (expiry[0][0] < cutoff or len(index) > self.max_entries or len(expiry) > max_expiry):
+            epoch, key = expiry.popleft()
+            entry = index.get(key)
+            # 同一连接后续的抓包记录会刷新索引项，只删除未被刷新的
+            if entry is not None and entry[1] <= epoch:
+                del index[key]
+
+    def _try_join(self, epoch: int, packet: Dict) -> bool:
+        entry = self.index.get(self._key(packet))
+        if entry is None:
+            return False
+        capture_epoch, last_epoch, interface = entry
+        # 请求落在连接的时间段内时偏差为 0，否则为到时间段边界的距离
+        if epoch < capture_epoch:
+            skew = epoch - capture_epoch
+        elif epoch > last_epoch:
+            skew = epoch - last_epoch
+        else:
+            skew = 0
+        if skew < -self.max_skew or skew > self.retention:
+            return False
+        self.joined.append({
+            'timestamp': packet.get('timestamp'),
+            'src_ip': packet.get('src_ip'),
+            'src_port': packet.get('src_port'),
+            'url': packet.get('url'),
+            'user_agent': packet.get('user_agent'),
+            'capture_time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(capture_epoch)),
+            'capture_interface': interface,
+            'skew': skew,
+            'host': packet.get('host'),
+        })
+        self.matched += 1
+        return True
+
+    def _retry_pending(self) -> None:
+        """
+        判定等待中的记录：抓包数据已覆盖其时间（或等待过久）时最后尝试一次匹配，仍未匹配的计为未匹配
+
+        等待队列大致按记录时间排列，遇到第一条尚不能判定的记录即停止，每次只处理可判定的部分
+        """
+        pending = self.pending
+        if not pending:
+            return
+        deadline = int(time.time()) - max(self.retention, self.capture_delay + self.max_skew)
+        cutoff = self.watermark - self.capture_delay - self.max_skew  # 此前的抓包数据均已导出
+        while pending:
+            epoch = pending[0][0]
+            if epoch >= cutoff and epoch >= deadline:
+                break
+            epoch, packet = pending.popleft()
+            if not self._try_join(epoch, packet):
+                self.unmatched += 1
+
+    def process(self, packets: List[Dict]) -> List[Dict]:
+        if not packets:
+            return packets
+        if packets[0].get('interface') != 'nginx':
+            self._index_capture(packets)
+            self._retry_pending()
+            self._expire()
+            return packets
+        parse_timestamp = self.parse_timestamp
+        for packet in packets:
+            epoch = parse_timestamp(packet.get('timestamp'))
+            if self._try_join(epoch, packet):
+                continue
+            if len(self.pending) >= self.max_pending:
+                self.pending.popleft()
+                self.unmatched += 1
+            self.pending.append((epoch, packet))
+        return packets
+
+    def tick(self) -> None:
+        self._retry_pending()
+        if self.joined:
+            filename = segment_filename(self.path, self.interval_type, "joined.csv")
+            append_csv(filename, self.HEADERS, self.joined)
+            logger.info(f"Wrote {len(self.joined)} joined records to {filename}")
+            self.joined = []
+
+    def stats(self) -> Dict:
+        return {
+            'matched': self.matched,
+            'unmatched': self.unmatched,
+            'pending': len(self.pending),
+            'index_entries': len(self.index),
+        }
+
+    def close(self) -> None:
+        self.tick()
+        logger.info(f"Correlation stats: {self.stats()}")
@@ -0,0 +1,215 @@
+import time
+import array
+import logging
+from typing import List, Dict, Optional, Sequence
+
+from processors.base import RecordProcessor, TimestampParser
+from writers.writer import segment_filename, append_csv
+
+logger = logging.getLogger(__name__)
+
+# 对数线性分桶：0-63µs 每微秒一个桶，之后每个 2 的幂区间再均分为 32 个桶，相对误差不超过 1/32
+EXACT_BUCKETS = 64
+SUB_BUCKETS = 32
+MAX_MICROS = (1 << 27) - 1  # 约 134 秒，更大的值计入最后一个桶
+BUCKET_COUNT = EXACT_BUCKETS + (MAX_MICROS.bit_length() - 6) * SUB_BUCKETS
+
+
+def bucket_index(micros: int) -> int:
+    if micros < EXACT_BUCKETS:
+        return micros if micros > 0 else 0
+    if micros > MAX_MICROS:
+        micros = MAX_MICROS
+    shift = micros.bit_length() - 6
+    return EXACT_BUCKETS + (shift - 1) * SUB_BUCKETS + (micros >> shift) - SUB_BUCKETS
+
+
+def bucket_value(index: int) -> float:
+    """桶的代表值（区间中点，微秒）"""
+    if index < EXACT_BUCKETS:
+        return float(index)
+    shift = (index - EXACT_BUCKETS) // SUB_BUCKETS + 1
+    low = ((index - EXACT_BUCKETS) % SUB_BUCKETS + SUB_BUCKETS) << shift
+    return low + ((1 << shift) - 1) / 2
+
+
+class LatencyHistogram:
+    """固定大小的对数线性直方图，每个直方图占用 BUCKET_COUNT 个 32 位计数（约 2.9 KiB）"""
+
+    __slots__ = ('counts', 'total', 'max')
+
+    def __init__(self):
+        self.counts = array.array('I', bytes(4 * BUCKET_COUNT))
+        self.total = 0
+        self.max = 0
+
+    def add(self, seconds: float) -> None:
+        micros = int(seconds * 1000000)
+        self.counts[bucket_index(micros)] += 1
+        self.total += 1
+        if micros > self.max:
+            self.max = micros
+
+    def percentiles(self, quantiles: Sequence[float]) -> List[Optional[float]]:
+        """一次累加求出多个分位数（quantiles 需升序），返回微秒值；直方图为空时返回 None"""
+        if not self.total:
+            return [None] * len(quantiles)
+        targets = [max(1, int(q * self.total + 0.999999)) for q in quantiles]
+        results = []
+        seen = 0
+        position = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            while position < len(targets) and seen >= targets[position]:
+                # 代表值不超过实际最大值
+                results.append(min(bucket_value(index), self.max))
+                position += 1
+            if position == len(targets):
+                break
+        return results
+
+
+def url_prefix(url: str, depth: int) -> str:
+    """取 URL 路径的前 depth 段作为前缀，去掉协议、主机和查询参数：https://a.com/api/v1/x?y → /api"""
+    if not url:
+        return '/'
+    start = url.find('://')
+    start = url.find('/', start + 3) if start >= 0 else url.find('/')
+    if start < 0:
+        return '/'
+    end = len(url)
+    for separator in '?#':
+        position = url.find(separator, start)
+        if 0 <= position < end:
+            end = position
+    segments = [segment for segment in url[start:end].split('/') if segment][:depth]
+    return '/' + '/'.join(segments)
+
+
+class LatencyHistograms(RecordProcessor):
+    """
+    Nginx 请求耗时的分钟级分位数
+
+    需要第 2 版 custom 日志格式（含 $request_time 和 $upstream_response_time），没有耗时字段的记录被忽略。
+    按 (站点, 分钟) 和 (站点, URL 前缀, 分钟) 分别维护请求耗时与上游耗时的直方图，
+    分钟结束 grace 秒后输出 p50/p95/p99/max 到按小时分段的 .latency.csv。
+    启用 URL 归一化时按 route 字段取前缀。每分钟每站点最多 max_keys 个前缀，超出的前缀合并为 "(other)"。
+    """
+
+    HEADERS = ['minute', 'site', 'prefix', 'requests', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms',
+               'upstream_requests', 'upstream_p50_ms', 'upstream_p95_ms', 'upstream_p99_ms', 'upstream_max_ms',
+               'host']
+    QUANTILES = (0.5, 0.95, 0.99)
+    SITE_PREFIX = '*'  # 站点整体的行
+    OTHER_PREFIX = '(other)'
+
+    def __init__(self, path: str, prefix_depth: int = 1, max_keys: int = 1000, grace: int = 120):
+        """
+        Args:
+            path: 记录目录
+            prefix_depth: URL 前缀取路径的前几段，0 表示只统计站点整体
+            max_keys: 每分钟每站点的前缀上限
+            grace: 分钟结束后等待迟到记录的时间（秒）
+        """
+        self.path = path
+        self.prefix_depth = prefix_depth
+        self.max_keys = max_keys
+        self.grace = grace
+        self.minutes: Dict[tuple, list] = {}  # (host, site, prefix, minute) -> [请求耗时直方图, 上游耗时直方图]
+        self.prefix_counts: Dict[tuple, int] = {}  # (host, site, minute) -> 前缀数
+        self.prefixes: Dict[str, str] = {}  # URL -> 前缀
+        self.parse_timestamp = TimestampParser()
+        self.rows_written = 0
+        self.overflowed = 0
+
+    def _prefix(self, url: str) -> str:
+        prefix = self.prefixes.get(url)
+        if prefix is None:
+            prefix = url_prefix(url, self.prefix_depth)
+            if len(self.prefixes) >= 100000:
+                self.prefixes.clear()
+            self.prefixes[url] = prefix
+        return prefix
+
+    def _histograms(self, host: str, site: str, prefix: str, minute: int) -> list:
+        key = (host, site, prefix, minute)
+        histograms = self.minutes.get(key)
+        if histograms is None:
+            if prefix != self.SITE_PREFIX and prefix != self.OTHER_PREFIX:
+                site_key = (host, site, minute)
+                count = self.prefix_counts.get(site_key, 0)
+                if count >= self.max_keys:
+                    self.overflowed += 1
+                    return self._histograms(host, site, self.OTHER_PREFIX, minute)
+                self.prefix_counts[site_key] = count + 1
+            histograms = [LatencyHistogram(), LatencyHistogram()]
+            self.minutes[key] = histograms
+        return histograms
+
+    def process(self, packets: List[Dict]) -> List[Dict]:
+        if not packets or packets[0].get('interface') != 'nginx':
+            return packets
+        parse_timestamp = self.parse_timestamp
+        for packet in packets:
+            request_time = packet.get('request_time')
+            if request_time is None:
+                continue
+            upstream_time = packet.get('upstream_time')
+            minute = parse_timestamp(packet.get('timestamp')) // 60 * 60
+            host, site = packet.get('host'), packet.get('site')
+            targets = [self._histograms(host, site, self.SITE_PREFIX, minute)]
+            if self.prefix_depth:
+                url = packet.get('route') or packet.get('url')
+                targets.append(self._histograms(host, site, self._prefix(url), minute))
+            for histograms in targets:
+                histograms[0].add(request_time)
+                if upstream_time is not None:
+                    histograms[1].add(upstream_time)
+        return packets
+
+    def _summary(self, histogram: LatencyHistogram) -> List:
+        return [None if value is None else round(value / 1000, 3)
+                for value in histogram.percentiles(self.QUANTILES) + [histogram.max if histogram.total else None]]
+
+    def _flush(self, cutoff: float) -> None:
+        """写出 cutoff 之前已结束的分钟"""
+        by_file: Dict[str, List[Dict]] = {}
+        for key in [key for key in self.minutes if key[3] + 60 <= cutoff]:
+            host, site, prefix, minute = key
+            request, upstream = self.minutes.pop(key)
+            self.prefix_counts.pop((host, site, minute), None)
+            p50, p95, p99, maximum = self._summary(request)
+            upstream_p50, upstream_p95, upstream_p99, upstream_maximum = self._summary(upstream)
+            filename = segment_filename(self.path, "hour", "latency.csv", time.localtime(minute))
+            by_file.setdefault(filename, []).append({
+                'minute': time.strftime('%Y-%m-%d %H:%M', time.localtime(minute)),
+                'site': site,
+                'prefix': prefix,
+                'requests': request.total,
+                'p50_ms': p50,
+                'p95_ms': p95,
+                'p99_ms': p99,
+                'max_ms': maximum,
+                'upstream_requests': upstream.total,
+                'upstream_p50_ms': upstream_p50,
+                'upstream_p95_ms': upstream_p95,
+                'upstream_p99_ms': upstream_p99,
+                'upstream_max_ms': upstream_maximum,
+                'host': host,
+            })
+        for filename, rows in by_file.items():
+            rows.sort(key=lambda row: (row['minute'], row['site'] or '', row['prefix']))
+            append_csv(filename, self.HEADERS, rows)
+            self.rows_written += len(rows)
+            logger.info(f"Wrote {len(rows)} latency rows to {filename}")
+
+    def tick(self) -> None:
+        self._flush(time.time() - self.grace)
+
+    def stats(self) -> Dict:
+        return {'open_keys': len(self.minutes), 'rows_written': self.rows_written, 'overflowed': self.overflowed}
+
+    def close(self) -> None:
+        self._flush(float('inf'))
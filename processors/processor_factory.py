@@ -0,0 +1,97 @@
+import math
+import logging
+from typing import Dict
+
+from processors.base import RecordProcessor
+from processors.rules import Rule, RulesEngine
+from processors.alert_sink import create_alert_sink
+from processors.correlator import ConnectionCorrelator
+from processors.rollup import MinuteRollup
+from processors.blocklist import BlocklistMatcher
+from processors.sessionizer import Sessionizer
+from processors.latency import LatencyHistograms
+from processors.url_normalizer import UrlNormalizer
+
+logger = logging.getLogger(__name__)
+
+class ProcessorFactory:
+    """工厂类，根据配置创建写入前的处理阶段"""
+
+    @staticmethod
+    def build_processor_specs(config: Dict) -> Dict[str, Dict]:
+        """
+        根据配置生成处理阶段描述，顺序即处理顺序
+
+        Returns:
+            以阶段名为键、相关配置为值的字典，热重载时仅重建配置发生变化的阶段
+        """
+        specs = {}
+        # 黑名单最先执行，后续阶段和输出可以使用 blocklisted 字段
+        blocklist_config = config.get("blocklist") or {}
+        if blocklist_config.get("enabled"):
+            specs["blocklist"] = dict(blocklist_config)
+        # URL 归一化在聚合类阶段之前，使其可以按 route 字段统计
+        normalize_config = config.get("normalize") or {}
+        if normalize_config.get("enabled"):
+            specs["normalize"] = dict(normalize_config)
+        if config.get("rules"):
+            specs["rules"] = {
+                "rules": config["rules"],
+                "alerts": config.get("alerts") or {},
+                "path": config["writers"]["path"],
+            }
+        correlation_config = config.get("correlation") or {}
+        if correlation_config.get("enabled"):
+            specs["correlation"] = dict(correlation_config, path=config["writers"]["path"],
+                                        interval_type=config["writers"]["interval_type"])
+            specs["correlation"].setdefault("capture_delay", ProcessorFactory.capture_delay(config))
+        rollup_config = config.get("rollup") or {}
+        if rollup_config.get("enabled"):
+            specs["rollup"] = dict(rollup_config, path=config["writers"]["path"])
+        sessions_config = config.get("sessions") or {}
+        if sessions_config.get("enabled"):
+            specs["sessions"] = dict(sessions_config, path=config["writers"]["path"],
+                                     interval_type=config["writers"]["interval_type"])
+        latency_config = config.get("latency") or {}
+        if latency_config.get("enabled"):
+            specs["latency"] = dict(latency_config, path=config["writers"]["path"])
+        return specs
+
+    @staticmethod
+    def capture_delay(config: Dict) -> int:
+        """网卡监控器导出流记录的最大延迟：活动超时 + 空闲超时 + 导出间隔，取各监控器的最大值"""
+        delay = 0
+        for monitor_config in config.get("monitors") or []:
+            if monitor_config.get("type", "network") != "network":
+                continue
+            flows = monitor_config.get("flows") or {}
+            delay = max(delay, math.ceil(flows.get("active_timeout", 30) + flows.get("idle_timeout", 10)
+                                         + monitor_config.get("interval", 5)))
+        return delay
+
+    @staticmethod
+    def create_processor(name: str, spec: Dict) -> RecordProcessor:
+        if name == "rules":
+            rules = [Rule(**rule_config) for rule_config in spec["rules"]]
+            engine = RulesEngine(rules, create_alert_sink(spec["alerts"], spec["path"]))
+            logger.info(f"Created rules engine with {len(rules)} rules")
+            return engine
+        if name == "correlation":
+            options = {key: value for key, value in spec.items() if key != "enabled"}
+            return ConnectionCorrelator(**options)
+        if name == "blocklist":
+            options = {key: value for key, value in spec.items() if key != "enabled"}
+            return BlocklistMatcher(**options)
+        if name == "normalize":
+            options = {key: value for key, value in spec.items() if key != "enabled"}
+            return UrlNormalizer(**options)
+        if name == "rollup":
+            options = {key: value for key, value in spec.items() if key != "enabled"}
+            return MinuteRollup(**options)
+        if name == "sessions":
+            options = {key: value for key, value in spec.items() if key != "enabled"}
+            return Sessionizer(**options)
+        if name == "latency":
+            options = {key: value for key, value in spec.items() if key != "enabled"}
+            return LatencyHistograms(**options)
+        raise ValueError(f"Unknown processor: {name}")
@@ -0,0 +1,208 @@
+import math
+import time
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+from processors.base import RecordProcessor, TimestampParser
+from processors.alert_sink import AlertSink
+
+logger = logging.getLogger(__name__)
+
+class WindowCounter:
+    """
+    分桶滑动窗口计数器
+
+    窗口划分为固定数量的桶，时间前进时只清理过期的桶，每个事件的均摊开销为 O(1)。
+    指定 distinct 时统计窗口内不同取值的数量，每个取值只记录最后出现的桶。
+    """
+
+    __slots__ = ('counts', 'total', 'last_bucket', 'last_seen', 'bucket_values', 'last_alert')
+
+    def __init__(self, buckets: int, distinct: bool):
+        self.counts = [0] * buckets
+        self.total = 0
+        self.last_bucket = None
+        self.last_seen = {} if distinct else None
+        self.bucket_values = {} if distinct else None
+        self.last_alert = None
+
+    def _advance(self, bucket: int) -> None:
+        buckets = len(self.counts)
+        if self.last_bucket is None:
+            self.last_bucket = bucket
+            return
+        for expired in range(self.last_bucket + 1, min(bucket, self.last_bucket + buckets) + 1):
+            slot = expired % buckets
+            self.total -= self.counts[slot]
+            self.counts[slot] = 0
+            if self.last_seen is not None:
+                stale = expired - buckets
+                for value in self.bucket_values.pop(slot, ()):
+                    if self.last_seen.get(value) == stale:
+                        del self.last_seen[value]
+        self.last_bucket = bucket
+
+    def add(self, bucket: int, value=None, max_values: int = 0, weight: int = 1) -> int:
+        """记录一个事件（采样记录按采样率加权），返回当前窗口内的事件数（或不同取值数）"""
+        buckets = len(self.counts)
+        if self.last_bucket is not None and bucket <= self.last_bucket - buckets:
+            # 早于窗口的乱序事件
+            return self.value()
+        if self.last_bucket is None or bucket > self.last_bucket:
+            self._advance(bucket)
+        slot = bucket % buckets
+        if self.last_seen is None:
+            self.counts[slot] += weight
+            self.total += weight
+            return self.total
+        previous = self.last_seen.get(value)
+        if previous is None:
+            if len(self.last_seen) >= max_values:
+                return len(self.last_seen)
+        elif previous >= bucket:
+            return len(self.last_seen)
+        self.last_seen[value] = bucket
+        values = self.bucket_values.get(slot)
+        if values is None:
+            self.bucket_values[slot] = [value]
+        else:
+            values.append(value)
+        return len(self.last_seen)
+
+    def value(self) -> int:
+        return self.total if self.last_seen is None else len(self.last_seen)
+
+
+class Rule:
+    """单条告警规则：按 key 字段分组，窗口内事件数（或不同取值数）超过阈值时告警"""
+
+    def __init__(self, name: str, threshold: int, window: int = 1, key: Optional[List[str]] = None,
+                 source: str = "any", distinct: Optional[str] = None, cooldown: int = 60,
+                 max_keys: int = 100000):
+        self.name = name
+        self.threshold = threshold
+        self.window = window
+        self.key = key or ["src_ip"]
+        self.source = source
+        self.distinct = distinct
+        self.cooldown = cooldown
+        self.max_keys = max_keys
+        # 最多使用60个桶，窗口较长时每个桶覆盖多秒
+        self.bucket_seconds = max(1, math.ceil(window / 60))
+        self.buckets = math.ceil(window / self.bucket_seconds)
+        # distinct 规则每个 key 最多保存的取值数，超过阈值后继续精确计数没有意义
+        self.max_values = threshold * 2 + 1
+        self.counters: "OrderedDict[tuple, WindowCounter]" = OrderedDict()
+        self.evicted = 0
+
+    def matches_source(self, interface: str) -> bool:
+        if self.source == "any":
+            return True
+        if self.source == "nginx":
+            return interface == "nginx"
+        return interface != "nginx"
+
+    def _add_spread(self, counter: WindowCounter, first: int, last: int, weight: int) -> int:
+        """
+        将流记录的包数按首包到末包的时间均匀分摊到各个桶，避免整条流的包数落在首包所在的一个桶里；
+        超出窗口长度的部分按比例折算，只分摊到最后 buckets 个桶
+        """
+        first_bucket = first // self.bucket_seconds
+        last_bucket = last // self.bucket_seconds
+        span = last_bucket - first_bucket + 1
+        if span > self.buckets:
+            weight = weight * self.buckets // span
+            first_bucket = last_bucket - self.buckets + 1
+            span = self.buckets
+        share, remainder = divmod(weight, span)
+        value = 0
+        for index, bucket in enumerate(range(first_bucket, last_bucket + 1)):
+            amount = share + (1 if index < remainder else 0)
+            if amount:
+                value = counter.add(bucket, weight=amount)
+        return value or counter.value()
+
+    def observe(self, packet: Dict, epoch: int, last_epoch: Optional[int] = None) -> Optional[Dict]:
+        """
+        处理一条记录，触发告警时返回告警内容
+
+        last_epoch 为流记录的末包时间，计数规则按首包到末包的时间分摊包数，告警时间取末包时间
+        """
+        key = tuple(packet.get(field) for field in self.key)
+        counter = self.counters.get(key)
+        if counter is None:
+            if len(self.counters) >= self.max_keys:
+                self.counters.popitem(last=False)
+                self.evicted += 1
+            counter = WindowCounter(self.buckets, self.distinct is not None)
+            self.counters[key] = counter
+        else:
+            self.counters.move_to_end(key)
+        bucket = epoch // self.bucket_seconds
+        if self.distinct is None:
+            # 预聚合记录按包数计，采样记录按采样率还原
+            weight = (packet.get('packets') or 1) * (packet.get('sample_rate') or 1)
+            if last_epoch is not None and last_epoch // self.bucket_seconds > bucket:
+                value = self._add_spread(counter, epoch, last_epoch, weight)
+            else:
+                value = counter.add(bucket, weight=weight)
+        else:
+            value = counter.add(bucket, packet.get(self.distinct), self.max_values)
+        if last_epoch is not None and last_epoch > epoch:
+            epoch = last_epoch
+        if value <= self.threshold:
+            return None
+        if counter.last_alert is not None and epoch - counter.last_alert < self.cooldown:
+            return None
+        counter.last_alert = epoch
+        return {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(epoch)),
+            'rule': self.name,
+            'key': dict(zip(self.key, key)),
+            'value': value,
+            'threshold': self.threshold,
+            'window': self.window,
+            'distinct': self.distinct,
+        }
+
+
+class RulesEngine(RecordProcessor):
+    """滑动窗口告警规则引擎，直接处理两类监控器的记录，命中的告警交给告警输出"""
+
+    def __init__(self, rules: List[Rule], sink: AlertSink):
+        self.rules = rules
+        self.sink = sink
+        self.parse_timestamp = TimestampParser()
+        self.alerts = 0
+
+    def process(self, packets: List[Dict]) -> List[Dict]:
+        if not packets:
+            return packets
+        interface = packets[0].get('interface')
+        rules = [rule for rule in self.rules if rule.matches_source(interface)]
+        if not rules:
+            return packets
+        parse_timestamp = self.parse_timestamp
+        for packet in packets:
+            epoch = parse_timestamp(packet.get('timestamp'))
+            last_seen = packet.get('last_seen')
+            last_epoch = parse_timestamp(last_seen) if last_seen else None
+            for rule in rules:
+                alert = rule.observe(packet, epoch, last_epoch)
+                if alert:
+                    self.alerts += 1
+                    logger.warning(f"Alert {alert['rule']}: {alert['key']} value {alert['value']} "
+                                   f"> {alert['threshold']} in {alert['window']}s")
+                    self.sink.emit(alert)
+        return packets
+
+    def stats(self) -> Dict:
+        return {
+            'alerts': self.alerts,
+            'keys': {rule.name: len(rule.counters) for rule in self.rules},
+            'evicted_keys': {rule.name: rule.evicted for rule in self.rules},
+        }
+
+    def close(self) -> None:
+        self.sink.close()
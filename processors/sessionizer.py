@@ -0,0 +1,177 @@
+import math
+import time
+import heapq
+import logging
+from typing import List, Dict
+
+from processors.base import RecordProcessor, TimestampParser
+from writers.writer import segment_filename, append_csv
+
+logger = logging.getLogger(__name__)
+
+class Session:
+    __slots__ = ('start', 'end', 'pages', 'urls', 'entry_url', 'exit_url', 'sequence')
+
+    def __init__(self, epoch: int, url: str):
+        self.start = epoch
+        self.end = epoch
+        self.pages = 0
+        self.urls = 0  # 线性计数位图，按 URL 哈希置位，用于估计不同 URL 数
+        self.entry_url = url
+        self.exit_url = url
+        self.sequence = 0  # 当前有效的堆项序号
+
+
+class Sessionizer(RecordProcessor):
+    """
+    Nginx 访问记录的流式会话划分
+
+    同一站点下 (src_ip, user_agent) 相同、相邻请求间隔不超过 gap 秒的记录归为一个会话。
+    打开的会话保存在字典中，另用最小堆按 "最后请求时间 + gap" 排列，每个会话在堆中只有一项：
+    出堆时若会话期间有新请求则按新的截止时间重新入堆，否则关闭会话。
+    打开的会话超过 max_sessions 时强制关闭最久没有请求的会话。
+    不同 URL 数用每个会话固定大小的线性计数位图估计（位数为不小于 max_urls 的 2 的幂，至少 64），
+    不随会话访问的 URL 增长；结果不超过 max_urls，等于 max_urls 时表示至少这么多。
+    关闭的会话写入分段目录下的 .sessions.csv。
+    """
+
+    HEADERS = ['start', 'end', 'duration', 'site', 'src_ip', 'user_agent', 'pages', 'distinct_urls', 'entry_url',
+               'exit_url', 'close_reason', 'host']
+
+    def __init__(self, path: str, interval_type: str, gap: int = 1800, max_sessions: int = 200000,
+                 max_urls: int = 1000):
+        """
+        Args:
+            path: 记录目录
+            interval_type: 分段间隔，与记录器一致
+            gap: 会话超时（秒）
+            max_sessions: 同时打开的会话上限
+            max_urls: 每个会话统计不同 URL 的上限，决定每个会话的位图大小（约 max_urls / 8 字节）
+        """
+        self.path = path
+        self.interval_type = interval_type
+        self.gap = gap
+        self.max_sessions = max_sessions
+        self.max_urls = max_urls
+        self.url_bits = max(64, 1 << (max_urls - 1).bit_length())
+        self.sessions: Dict[tuple, Session] = {}
+        self.expiry: List[tuple] = []  # (截止时间, 序号, key)
+        self.sequence = 0
+        self.closed: List[Dict] = []
+        self.parse_timestamp = TimestampParser()
+        self.emitted = 0
+        self.evicted = 0
+
+    def _schedule(self, key: tuple, session: Session) -> None:
+        self.sequence += 1
+        session.sequence = self.sequence
+        heapq.heappush(self.expiry, (session.end + self.gap, self.sequence, key))
+        if len(self.expiry) > 2 * self.max_sessions:
+            # 因间隔关闭的会话在堆中留有失效项，过多时按当前会话重建
+            self.expiry = [(value.end + self.gap, value.sequence, item) for item, value in self.sessions.items()]
+            heapq.heapify(self.expiry)
+
+    def _close(self, key: tuple, reason: str) -> None:
+        session = self.sessions.pop(key)
+        host, site, src_ip, user_agent = key
+        self.closed.append({
+            'start': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(session.start)),
+            'end': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(session.end)),
+            'duration': session.end - session.start,
+            'site': site,
+            'src_ip': src_ip,
+            'user_agent': user_agent,
+            'pages': session.pages,
+            'distinct_urls': self._distinct_urls(session.urls),
+            'entry_url': session.entry_url,
+            'exit_url': session.exit_url,
+            'close_reason': reason,
+            'host': host,
+        })
+        self.emitted += 1
+
+    def _distinct_urls(self, bitmap: int) -> int:
+        """线性计数估计：n ≈ -m·ln(空位数 / m)，位图填满时按上限计"""
+        empty = self.url_bits - bin(bitmap).count('1')
+        if empty == 0:
+            return self.max_urls
+        return min(self.max_urls, round(-self.url_bits * math.log(empty / self.url_bits)))
+
+    def _pop_expired(self, cutoff: float, reason: str, limit: int = -1) -> None:
+        """
+        关闭截止时间不晚于 cutoff 的会话；limit 大于 0 时最多关闭 limit 个，
+        cutoff 为无穷大时即按最久没有请求的顺序强制关闭
+        """
+        sessions = self.sessions
+        # _schedule 可能重建堆，每次都从 self.expiry 读取
+        while self.expiry and limit != 0:
+            deadline, sequence, key = self.expiry[0]
+            if deadline > cutoff:
+                break
+            heapq.heappop(self.expiry)
+            session = sessions.get(key)
+            if session is None or session.sequence != sequence:
+                # 会话已关闭（或同一 key 已开始新会话）
+                continue
+            if session.end + self.gap > deadline:
+                # 会话期间有新请求，按新的截止时间重新排队
+                self._schedule(key, session)
+                continue
+            self._close(key, reason)
+            limit -= 1
+
+    def process(self, packets: List[Dict]) -> List[Dict]:
+        if not packets or packets[0].get('interface') != 'nginx':
+            return packets
+        sessions = self.sessions
+        parse_timestamp = self.parse_timestamp
+        gap = self.gap
+        url_mask = self.url_bits - 1
+        watermark = 0
+        for packet in packets:
+            epoch = parse_timestamp(packet.get('timestamp'))
+            if epoch > watermark:
+                watermark = epoch
+            url = packet.get('url')
+            key = (packet.get('host'), packet.get('site'), packet.get('src_ip'), packet.get('user_agent'))
+            session = sessions.get(key)
+            if session is not None and epoch - session.end > gap:
+                self._close(key, 'gap')
+                session = None
+            if session is None:
+                if len(sessions) >= self.max_sessions:
+                    self._pop_expired(float('inf'), 'evicted', 1)
+                    self.evicted += 1
+                session = Session(epoch, url)
+                sessions[key] = session
+                self._schedule(key, session)
+            # NginxLogMonitor 从文件末尾向前读取，同一秒内先到的是较晚的请求：
+            # 入口取时间最早（相同时取后到）的记录，出口取时间最晚（相同时取先到）的记录
+            if epoch <= session.start:
+                session.start = epoch
+                session.entry_url = url
+            if epoch > session.end:
+                session.end = epoch
+                session.exit_url = url
+            session.pages += 1
+            session.urls |= 1 << (hash(url) & url_mask)
+        # 按记录时间关闭已超时的会话，不必等到 tick
+        self._pop_expired(watermark, 'timeout')
+        return packets
+
+    def tick(self) -> None:
+        self._pop_expired(time.time(), 'timeout')
+        if self.closed:
+            filename = segment_filename(self.path, self.interval_type, "sessions.csv")
+            append_csv(filename, self.HEADERS, self.closed)
+            logger.info(f"Wrote {len(self.closed)} sessions to {filename}")
+            self.closed = []
+
+    def stats(self) -> Dict:
+        return {'open_sessions': len(self.sessions), 'emitted': self.emitted, 'evicted': self.evicted}
+
+    def close(self) -> None:
+        for key in list(self.sessions):
+            self._close(key, 'shutdown')
+        self.expiry = []
+        self.tick()
@@ -0,0 +1,202 @@
+import re
+import logging
+from typing import List, Dict, Optional, Sequence
+
+from processors.base import RecordProcessor
+
+logger = logging.getLogger(__name__)
+
+UUID_PATTERN = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+HASH_PATTERN = re.compile(r'[0-9a-fA-F]{16,}$')
+VARIABLE = '{var}'
+OTHER_SCOPE = '(other)'
+
+
+def classify_segment(segment: str) -> str:
+    """将数字、UUID、十六进制哈希路径段替换为占位符，其余原样返回"""
+    if segment.isdigit():
+        return '{int}'
+    if len(segment) == 36 and UUID_PATTERN.match(segment):
+        return '{uuid}'
+    if len(segment) >= 16 and HASH_PATTERN.match(segment):
+        return '{hash}'
+    return segment
+
+
+class _Node:
+    __slots__ = ('children', 'variable')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.variable: Optional['_Node'] = None  # 取值过多后该位置的所有路径段归入此子节点
+
+
+def _size(node: _Node) -> int:
+    size = 1
+    for child in node.children.values():
+        size += _size(child)
+    if node.variable is not None:
+        size += _size(node.variable)
+    return size
+
+
+class RouteTrie:
+    """
+    按路径段学习路由模板的前缀树
+
+    根节点之下先按作用域（站点/主机）分开，各站点分别学习，互不影响；作用域最多 max_scopes 个，
+    超出的站点共用 "(other)"。每个节点最多 max_children 个不同的字面子节点，超过时判定该位置为参数：
+    丢弃已学到的字面子节点，之后该位置的任何路径段都归为 {var}。整棵树不超过 max_nodes 个节点，
+    达到上限后新出现的路径段直接归为 {var}。
+    """
+
+    def __init__(self, max_children: int = 100, max_nodes: int = 100000, max_depth: int = 16,
+                 max_scopes: int = 1000):
+        """
+        Args:
+            max_children: 单个位置的不同路径段上限
+            max_nodes: 节点总数上限
+            max_depth: 参与学习的路径段数，更深的部分合并为一个 {var}
+            max_scopes: 分别学习的站点数上限
+        """
+        self.max_children = max_children
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.max_scopes = max_scopes
+        self.root = _Node()
+        self.nodes = 1
+        self.generalized = 0  # 判定为参数的位置数，变化时调用方需清空该作用域的缓存
+
+    def scope(self, name: str) -> str:
+        """返回实际使用的作用域名，站点数达到上限后新站点归入 "(other)" """
+        if name in self.root.children or len(self.root.children) < self.max_scopes:
+            return name
+        return OTHER_SCOPE
+
+    def template(self, path: str, scope: str = '') -> str:
+        segments = [classify_segment(segment) for segment in path.split('/') if segment]
+        if len(segments) > self.max_depth:
+            segments = segments[:self.max_depth] + [VARIABLE]
+        scope = self.scope(scope)
+        node = self.root.children.get(scope)
+        if node is None:
+            node = self.root.children[scope] = _Node()
+            self.nodes += 1
+        parts = []
+        for segment in segments:
+            if node.variable is not None:
+                node = node.variable
+                parts.append(VARIABLE)
+                continue
+            child = node.children.get(segment)
+            if child is None:
+                if len(node.children) >= self.max_children:
+                    # 该位置取值过多，视为参数
+                    self.nodes -= sum(_size(old) for old in node.children.values()) - 1
+                    node.children = {}
+                    node.variable = _Node()
+                    self.generalized += 1
+                    node = node.variable
+                    parts.append(VARIABLE)
+                    continue
+                if self.nodes >= self.max_nodes:
+                    # 不再学习，剩余部分只做占位符替换
+                    parts.extend(item if item.startswith('{') else VARIABLE for item in segments[len(parts):])
+                    break
+                child = _Node()
+                node.children[segment] = child
+                self.nodes += 1
+            node = child
+            parts.append(segment)
+        template = '/' + '/'.join(parts)
+        if path.endswith('/') and parts:
+            template += '/'
+        return template
+
+
+class UrlNormalizer(RecordProcessor):
+    """
+    Nginx 访问记录的 URL 归一化
+
+    去掉查询参数（keep_params 中的参数保留）和片段，路径中的数字、UUID、哈希段替换为占位符，
+    再经 RouteTrie 把取值过多的路径段归为 {var}，结果写入 route 字段，如
+    https://a.com/api/users/123/orders?page=2 → /api/users/{int}/orders。
+    路由模板按 URL 中的主机分别学习（没有主机时按 site 字段），各主机的结果分别缓存，
+    重复路径只需一次字典查找。
+    """
+
+    def __init__(self, keep_params: Sequence[str] = (), rewrite_url: bool = False, max_children: int = 100,
+                 max_nodes: int = 100000, max_depth: int = 16, cache_size: int = 100000, max_sites: int = 1000):
+        """
+        Args:
+            keep_params: 保留的查询参数名
+            rewrite_url: 为 True 时同时用归一化结果替换 url 字段（保留协议和主机）
+            max_children: 单个路径位置的不同取值上限，超过后视为参数
+            max_nodes: 路由前缀树的节点上限
+            max_depth: 参与学习的路径段数
+            cache_size: 各主机合计缓存的原始路径数，超过后清空
+            max_sites: 分别学习路由模板的主机数，超出的主机共用一棵子树
+        """
+        self.keep_params = frozenset(keep_params)
+        self.rewrite_url = rewrite_url
+        self.cache_size = cache_size
+        self.trie = RouteTrie(max_children, max_nodes, max_depth, max_sites)
+        self.caches: Dict[str, Dict[str, str]] = {}  # 作用域 -> {原始路径: 模板}
+        self.cached = 0
+        self.generalized = 0
+        self.normalized = 0
+        self.misses = 0
+
+    def _query(self, query: str) -> str:
+        kept = [item for item in query.split('&') if item.split('=', 1)[0] in self.keep_params]
+        return '?' + '&'.join(kept) if kept else ''
+
+    def process(self, packets: List[Dict]) -> List[Dict]:
+        if not packets or packets[0].get('interface') != 'nginx':
+            return packets
+        caches = self.caches
+        trie = self.trie
+        keep_params = self.keep_params
+        for packet in packets:
+            url = packet.get('url')
+            if not url:
+                continue
+            # url 为 $scheme://$http_host$request_uri，路径从主机之后的第一个 / 开始
+            scheme = url.find('://')
+            start = url.find('/', scheme + 3) if scheme >= 0 else url.find('/')
+            if start < 0:
+                origin, path, query = url, '/', ''
+            else:
+                origin = url[:start]
+                path, _, query = url[start:].partition('?')
+                path = path.partition('#')[0]
+            scope = trie.scope(origin[scheme + 3:].lower() if scheme >= 0 else packet.get('site') or '')
+            cache = caches.get(scope)
+            if cache is None:
+                cache = caches[scope] = {}
+            route = cache.get(path)
+            if route is None:
+                self.misses += 1
+                route = trie.template(path, scope)
+                if trie.generalized != self.generalized:
+                    # 该主机有位置被判定为参数，其已缓存的结果可能过时
+                    self.generalized = trie.generalized
+                    self.cached -= len(cache)
+                    cache.clear()
+                if self.cached >= self.cache_size:
+                    caches.clear()
+                    self.cached = 0
+                    cache = caches[scope] = {}
+                cache[path] = route
+                self.cached += 1
+            if keep_params and query:
+                route += self._query(query.partition('#')[0])
+            packet['route'] = route
+            if self.rewrite_url:
+                packet['url'] = origin + route
+        self.normalized += len(packets)
+        return packets
+
+    def stats(self) -> Dict:
+        return {'normalized': self.normalized, 'cache_misses': self.misses, 'trie_nodes': self.trie.nodes,
+                'sites': len(self.trie.root.children), 'generalized': self.trie.generalized}
@@ -0,0 +1,162 @@
+import os
+import sys
+import time
+import logging
+import linecache
+import threading
+from collections import Counter
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SamplingProfiler:
+    """
+    覆盖所有线程的采样分析器
+
+    后台线程按固定间隔读取 sys._current_frames() 中各线程的调用栈，不插桩，开销与线程数和采样频率成正比，
+    与业务代码的调用次数无关。结束后输出两个文件：
+    - <output>.collapsed：折叠栈格式（线程;帧;帧... 次数），可直接交给 flamegraph.pl / speedscope
+    - <output>.stages.txt：按线程和处理阶段汇总的墙钟时间
+
+    多进程抓包（workers > 1）的工作进程不在本进程内，不会被采样。
+    """
+
+    # 从栈顶向下匹配文件路径，第一个命中的规则决定该样本所属的阶段
+    STAGE_RULES = [
+        ("scapy", "scapy"),
+        ("nginx_log_monitor", "nginx_parse"),
+        (os.path.join("monitors", ""), "capture"),
+        (os.path.join("writers", "spool"), "spool"),
+        (os.path.join("writers", ""), "write"),
+        (os.path.join("processors", ""), "process"),
+        (os.path.join("transport", ""), "transport"),
+        (os.path.join("observers", ""), "observer"),
+        ("yaml", "config"),
+        ("queue.py", "queue"),
+    ]
+    # 栈顶处于这些调用时视为等待，即线程空闲
+    IDLE_FUNCTIONS = {"wait", "select", "poll", "accept", "sleep", "_wait_for_tstate_lock", "serve_forever"}
+    IDLE_CALLS = ("sleep(", ".wait(", "select(", ".recv(", ".recv_into(", "sniff(", ".get(timeout")
+
+    def __init__(self, output: str, interval: float = 0.01):
+        """
+        Args:
+            output: 输出文件前缀
+            interval: 采样间隔（秒）
+        """
+        self.output = output
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.stages: Counter = Counter()  # (线程名, 阶段) -> 样本数
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0.0
+        self._stop_event = threading.Event()
+        self.thread = None
+        self._frame_names: Dict[Tuple, str] = {}
+        self._idle_lines: Dict[Tuple, bool] = {}
+
+    def _frame_name(self, code, lineno: int) -> str:
+        key = (code, lineno)
+        name = self._frame_names.get(key)
+        if name is None:
+            name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{lineno})"
+            self._frame_names[key] = name
+        return name
+
+    def _is_idle(self, code, lineno: int) -> bool:
+        """根据栈顶函数名或源码行判断是否处于阻塞调用（C 函数没有 Python 帧，只能看调用它的那一行）"""
+        if code.co_name in self.IDLE_FUNCTIONS:
+            return True
+        key = (code.co_filename, lineno)
+        idle = self._idle_lines.get(key)
+        if idle is None:
+            line = linecache.getline(code.co_filename, lineno)
+            idle = any(call in line for call in self.IDLE_CALLS)
+            self._idle_lines[key] = idle
+        return idle
+
+    def _stage(self, frames) -> str:
+        for code, _ in frames:
+            filename = code.co_filename
+            for pattern, stage in self.STAGE_RULES:
+                if pattern in filename:
+                    return stage
+        return "other"
+
+    def _sample(self) -> None:
+        own_ident = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append((frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            if not frames:
+                continue
+            thread_name = names.get(ident, f"thread-{ident}")
+            leaf_code, leaf_line = frames[0]
+            stage = "idle" if self._is_idle(leaf_code, leaf_line) else self._stage(frames)
+            self.stages[(thread_name, stage)] += 1
+            stack = ";".join(self._frame_name(code, lineno) for code, lineno in reversed(frames))
+            self.stacks[f"{thread_name};{stack}"] += 1
+        self.samples += 1
+
+    def _run(self, duration: float) -> None:
+        deadline = time.monotonic() + duration
+        while not self._stop_event.is_set() and time.monotonic() < deadline:
+            try:
+                self._sample()
+            except Exception as e:
+                logger.error(f"Profiler sample failed: {e}")
+            self._stop_event.wait(self.interval)
+        self.elapsed = time.monotonic() - self.started
+        self.write()
+
+    def start(self, duration: float) -> None:
+        """开始采样，duration 秒后自动停止并写出结果"""
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self._run, args=(duration,), name="profiler")
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info(f"Profiling all threads for {duration}s, interval {self.interval}s")
+
+    def stop(self) -> None:
+        """提前停止并写出结果"""
+        if self.thread and self.thread.is_alive():
+            self._stop_event.set()
+            self.thread.join()
+
+    def write(self) -> None:
+        collapsed = f"{self.output}.collapsed"
+        with open(collapsed, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        # 实际采样间隔会略大于设定值，按实际时长折算每个样本代表的墙钟时间
+        seconds_per_sample = self.elapsed / self.samples if self.samples else 0
+        threads: Dict[str, int] = Counter()
+        for (thread_name, _), count in self.stages.items():
+            threads[thread_name] += count
+        stages_file = f"{self.output}.stages.txt"
+        with open(stages_file, "w", encoding="utf-8") as f:
+            f.write(f"duration: {self.elapsed:.1f}s, samples: {self.samples}, "
+                    f"interval: {seconds_per_sample * 1000:.1f}ms\n\n")
+            f.write(f"{'thread':<24}{'stage':<14}{'wall(s)':>10}{'share':>9}\n")
+            for thread_name, total in threads.most_common():
+                stages = sorted(((count, stage) for (name, stage), count in self.stages.items()
+                                 if name == thread_name), reverse=True)
+                for count, stage in stages:
+                    f.write(f"{thread_name:<24}{stage:<14}{count * seconds_per_sample:>10.2f}"
+                            f"{count / total:>9.1%}\n")
+            busy = Counter()
+            for (_, stage), count in self.stages.items():
+                if stage != "idle":
+                    busy[stage] += count
+            busy_total = sum(busy.values())
+            f.write(f"\n{'stage (all threads, busy only)':<38}{'wall(s)':>10}{'share':>9}\n")
+            for stage, count in busy.most_common():
+                f.write(f"{stage:<38}{count * seconds_per_sample:>10.2f}{count / busy_total:>9.1%}\n")
+        logger.info(f"Profile written to {collapsed} and {stages_file}")
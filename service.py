@@ -0,0 +1,279 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from config_manager import ConfigManager
+from monitors.base_monitor import BaseMonitor
+from monitors.monitor_factory import MonitorFactory
+from processors.processor_factory import ProcessorFactory
+from writers.writer import TrafficWriter
+from writers.spool import DiskSpool
+from transport.agent import RecordShipper
+from transport.collector import RecordCollector
+
+logger = logging.getLogger(__name__)
+
+class MonitorService:
+    """协调监控器与记录器的运行，支持配置热重载"""
+
+    MODES = ('standalone', 'agent', 'collector')
+
+    def __init__(self, config_manager: ConfigManager, poll_interval: int = 5, mode: str = 'standalone',
+                 stats_interval: int = 60):
+        """
+        初始化服务
+
+        Args:
+            config_manager: 配置管理器
+            poll_interval: 主循环周期（秒），同时也是配置文件变更的检查周期
+            mode: 运行模式，standalone 本地写入，agent 发送到汇聚端，collector 接收代理数据并本地写入
+            stats_interval: 输出运行统计的间隔（秒）
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported mode {mode}, must be one of {self.MODES}")
+        self.config_manager = config_manager
+        self.poll_interval = poll_interval
+        self.mode = mode
+        self.stats_interval = stats_interval
+        self.last_stats = time.monotonic()
+        self.monitors: Dict[str, BaseMonitor] = {}
+        self.monitor_specs: Dict[str, Dict] = {}
+        self.processors: Dict[str, object] = {}
+        self.processor_specs: Dict[str, Dict] = {}
+        self.spool = self._create_spool(config_manager.get_writers_config().get('spool'))
+        self.writer = None
+        self.shipper = None
+        self.collector = None
+        if mode == 'agent':
+            self.shipper = self._create_shipper(config_manager.get_config())
+        else:
+            self.writer = TrafficWriter(**self._writer_settings(config_manager.get_config()))
+        if mode == 'collector':
+            self.collector = RecordCollector(config_manager.get_config()['cluster']['address'], self.spool)
+        self._reload_requested = threading.Event()
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _writer_settings(config: Dict) -> Dict:
+        writers_config = config['writers']
+        return {
+            'path': writers_config['path'],
+            'format': writers_config['format'],
+            'interval_type': writers_config['interval_type'],
+            'filter_superfluous_ip': config['system']['filter_superfluous_ip'],
+            'fake_img': writers_config['fake_img'],
+        }
+
+    @staticmethod
+    def _create_spool(spool_config) -> Optional[DiskSpool]:
+        """启用时创建磁盘队列，所有监控器共用；修改队列配置需要重启程序"""
+        if not spool_config or not spool_config.get('enabled'):
+            return None
+        return DiskSpool(
+            path=spool_config['path'],
+            segment_size_mb=spool_config.get('segment_size_mb', 16),
+            max_segments=spool_config.get('max_segments', 64),
+            overflow=spool_config.get('overflow', 'drop_oldest'),
+        )
+
+    @staticmethod
+    def _create_shipper(config: Dict) -> RecordShipper:
+        cluster_config = config['cluster']
+        return RecordShipper(
+            address=cluster_config['address'],
+            host=cluster_config.get('name'),
+            batch_size=cluster_config.get('batch_size', 5000),
+            buffer_records=cluster_config.get('buffer_records', 1000000),
+            compress_level=cluster_config.get('compress_level', 1),
+        )
+
+    def _build_specs(self) -> Dict[str, Dict]:
+        config = self.config_manager.get_config()
+        return MonitorFactory.build_monitor_specs(config, config['system']['filter_internal_ip'])
+
+    def start(self) -> None:
+        """创建并启动所有监控器（网卡 + Nginx），创建失败时抛出异常"""
+        if self.shipper:
+            self.shipper.start()
+        if self.collector:
+            self.collector.start()
+        self._apply_processor_specs(ProcessorFactory.build_processor_specs(self.config_manager.get_config()))
+        for key, spec in self._build_specs().items():
+            monitor = MonitorFactory.create_monitor(spec, self.spool)
+            monitor.start()
+            self.monitors[key] = monitor
+            self.monitor_specs[key] = spec
+
+    @staticmethod
+    def _group_by_interface(packet_dicts) -> Dict[str, list]:
+        packets_by_interface = {}
+        for packet_dict in packet_dicts:
+            interface = list(packet_dict.keys())[0]
+            if interface not in packets_by_interface:
+                packets_by_interface[interface] = []
+            packets_by_interface[interface].extend(packet_dict[interface])
+        return packets_by_interface
+
+    def _write(self, packets_by_interface: Dict[str, list]) -> None:
+        for processor in self.processors.values():
+            for interface, packets in packets_by_interface.items():
+                if packets:
+                    packets_by_interface[interface] = processor.process(packets)
+        if self.shipper:
+            self.shipper.send([{interface: packets} for interface, packets in packets_by_interface.items() if packets])
+            return
+        for interface, packets in packets_by_interface.items():
+            if packets:
+                print(f"Writing {len(packets)} packets for interface {interface}")
+                logger.info(f"Writing {len(packets)} packets for interface {interface}")
+                self.writer.write(packets)
+
+    def _flush_monitor(self, monitor) -> None:
+        """取出监控器队列中的全部数据并写入"""
+        self._write(self._group_by_interface(monitor.drain()))
+
+    def _flush_spool(self) -> None:
+        """从磁盘队列读取数据写入，写入成功后提交消费位置"""
+        while True:
+            packet_dicts, position = self.spool.read_batch()
+            if not packet_dicts:
+                break
+            try:
+                self._write(self._group_by_interface(packet_dicts))
+            except Exception as e:
+                logger.error(f"Failed to write spooled packets, will retry: {e}")
+                self.spool.rewind()
+                break
+            self.spool.commit(position)
+
+    def flush(self) -> None:
+        if self.spool:
+            self._flush_spool()
+            return
+        for monitor in list(self.monitors.values()):
+            self._flush_monitor(monitor)
+        if self.collector:
+            self._flush_monitor(self.collector)
+
+    def _stop_monitor(self, key: str) -> None:
+        monitor = self.monitors.pop(key)
+        self.monitor_specs.pop(key, None)
+        monitor.stop()
+        # 停止后写出队列中剩余的数据，避免丢失；使用磁盘队列时数据已落盘，由主循环统一写出
+        if not self.spool:
+            self._flush_monitor(monitor)
+        logger.info(f"Monitor {key} removed")
+
+    def _apply_monitor_specs(self, specs: Dict[str, Dict]) -> None:
+        """对比新旧监控器描述，仅停止或启动发生变化的监控器"""
+        for key in list(self.monitors):
+            if key not in specs or specs[key] != self.monitor_specs[key]:
+                self._stop_monitor(key)
+        for key, spec in specs.items():
+            if key in self.monitors:
+                continue
+            try:
+                monitor = MonitorFactory.create_monitor(spec, self.spool)
+                monitor.start()
+            except ValueError as e:
+                logger.error(f"Failed to start monitor {key}: {e}")
+                continue
+            self.monitors[key] = monitor
+            self.monitor_specs[key] = spec
+            logger.info(f"Monitor {key} added")
+
+    def _apply_processor_specs(self, specs: Dict[str, Dict]) -> None:
+        """对比新旧处理阶段描述，仅重建发生变化的阶段，并按描述顺序排列"""
+        processors = {}
+        for name, spec in specs.items():
+            if name in self.processors and self.processor_specs[name] == spec:
+                processors[name] = self.processors.pop(name)
+                continue
+            try:
+                processors[name] = ProcessorFactory.create_processor(name, spec)
+            except (OSError, ValueError, TypeError, KeyError) as e:
+                logger.error(f"Failed to create processor {name}: {e}")
+                continue
+            logger.info(f"Processor {name} added")
+        for name, processor in self.processors.items():
+            processor.close()
+            logger.info(f"Processor {name} removed")
+        self.processors = processors
+        self.processor_specs = {name: specs[name] for name in processors}
+
+    def stats(self) -> Dict:
+        """汇总各组件的运行统计"""
+        stats = {key: monitor.stats() for key, monitor in self.monitors.items()}
+        stats.update({name: processor.stats() for name, processor in self.processors.items()})
+        if self.spool:
+            stats['spool'] = {'backlog_bytes': self.spool.backlog_bytes(), 'dropped': self.spool.dropped}
+        if self.shipper:
+            stats['agent'] = self.shipper.stats()
+        if self.collector:
+            stats['collector'] = self.collector.stats()
+        return stats
+
+    def _log_stats(self) -> None:
+        now = time.monotonic()
+        if now - self.last_stats < self.stats_interval:
+            return
+        self.last_stats = now
+        for name, stats in self.stats().items():
+            if stats:
+                logger.info(f"Stats {name}: {stats}")
+
+    def request_reload(self) -> None:
+        """请求在下一轮主循环中重新加载配置（可在信号处理函数中调用）"""
+        self._reload_requested.set()
+
+    def reload(self) -> None:
+        try:
+            changed = self.config_manager.reload()
+        except Exception as e:
+            # 类型不符的配置可能在校验中抛出 ValueError 以外的异常，任何失败都不能让服务退出
+            logger.error(f"Failed to reload config, keeping current config: {e!r}")
+            return
+        if not changed:
+            logger.info("Config reloaded, nothing changed")
+            return
+        logger.info("Config changed, applying")
+        try:
+            self._apply_monitor_specs(self._build_specs())
+            self._apply_processor_specs(ProcessorFactory.build_processor_specs(self.config_manager.get_config()))
+            if self.writer:
+                self.writer.reconfigure(**self._writer_settings(self.config_manager.get_config()))
+        except Exception as e:
+            logger.error(f"Failed to apply reloaded config, some components may keep the previous settings: {e!r}")
+
+    def run_forever(self) -> None:
+        """主循环：定期写出监控数据并检查配置变更，直到 stop() 被调用"""
+        while not self._stop_event.is_set():
+            self.flush()
+            for processor in list(self.processors.values()):
+                processor.tick()
+            self._log_stats()
+            if self._reload_requested.is_set() or self.config_manager.has_changed():
+                self._reload_requested.clear()
+                self.reload()
+            self._stop_event.wait(self.poll_interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def shutdown(self) -> None:
+        """停止所有监控器并写出剩余数据"""
+        for key in list(self.monitors):
+            self._stop_monitor(key)
+        if self.collector:
+            self.collector.stop()
+            if not self.spool:
+                self._flush_monitor(self.collector)
+        if self.spool:
+            self._flush_spool()
+            self.spool.close()
+        self._apply_processor_specs({})
+        if self.writer:
+            self.writer.close()
+        if self.shipper:
+            self.shipper.stop()
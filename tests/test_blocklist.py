@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from processors.blocklist import Blocklist, BlocklistMatcher, HEADER, build_blocklist
+
+
+@pytest.fixture
+def compiled(tmp_path):
+    source = tmp_path / "list.txt"
+    source.write_text("1.2.3.4\n10.0.0.0/8\n2001:db8::1\n2001:db8:1::/48\n")
+    output = str(tmp_path / "blocklist.bin")
+    build_blocklist([str(source)], output)
+    return output
+
+
+def test_lookup(compiled):
+    blocklist = Blocklist(compiled)
+    try:
+        assert blocklist.contains("1.2.3.4")
+        assert blocklist.contains("10.20.30.40")
+        assert blocklist.contains("2001:db8:1::5")
+        assert not blocklist.contains("1.2.3.5")
+    finally:
+        blocklist.close()
+
+
+@pytest.mark.parametrize("keep", [0, 10, HEADER.size, -1])
+def test_truncated_file_raises_value_error(compiled, keep):
+    with open(compiled, "rb") as f:
+        data = f.read()
+    with open(compiled, "wb") as f:
+        f.write(data[:keep] if keep >= 0 else data[:-1])
+    with pytest.raises(ValueError):
+        Blocklist(compiled)
+
+
+def test_reload_keeps_old_list_when_new_file_is_truncated(compiled):
+    matcher = BlocklistMatcher(compiled)
+    with open(compiled, "rb") as f:
+        data = f.read()
+    # 新文件只复制了一部分就被换到位
+    partial = compiled + ".partial"
+    with open(partial, "wb") as f:
+        f.write(data[:HEADER.size + 3])
+    stat = os.stat(compiled)
+    os.utime(partial, (stat.st_atime, stat.st_mtime + 5))
+    os.replace(partial, compiled)
+    matcher.tick()
+    packet = {"src_ip": "1.2.3.4"}
+    matcher.process([packet])
+    assert packet["blocklisted"] == "src_ip"
+    matcher.close()
@@ -0,0 +1,31 @@
+import queue
+import socket
+import logging
+
+from transport.collector import RecordCollector
+from transport.protocol import FRAME_HEADER, ACK, encode_batch, recv_exact
+
+
+def _connect(collector):
+    return socket.create_connection(collector.server.server_address, timeout=5)
+
+
+def test_garbled_frame_is_logged_and_connection_closed(caplog):
+    collector = RecordCollector("127.0.0.1:0", packet_queue=queue.Queue())
+    collector.start()
+    try:
+        with caplog.at_level(logging.ERROR, logger="transport.collector"):
+            with _connect(collector) as sock:
+                payload = b"not a zlib stream"
+                sock.sendall(FRAME_HEADER.pack(len(payload), 1) + payload)
+                assert sock.recv(ACK.size) == b""
+        assert any("Error receiving from agent" in record.getMessage() for record in caplog.records)
+
+        # 其他连接不受影响
+        with _connect(collector) as sock:
+            payload = encode_batch("agent-1", [{"eth0": [{"src_ip": "1.2.3.4"}]}])
+            sock.sendall(FRAME_HEADER.pack(len(payload), 2) + payload)
+            assert ACK.unpack(recv_exact(sock, ACK.size)) == (2,)
+        assert collector.packet_queue.get(timeout=5) == {"eth0": [{"src_ip": "1.2.3.4", "host": "agent-1"}]}
+    finally:
+        collector.stop()
@@ -0,0 +1,45 @@
+import os
+import shutil
+
+import pytest
+
+from config_manager import ConfigManager
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.yaml")
+
+
+def _touch(path, offset):
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + offset))
+
+
+def test_failed_reload_keeps_config_and_is_not_retried(tmp_path):
+    path = str(tmp_path / "config.yaml")
+    shutil.copy(CONFIG, path)
+    manager = ConfigManager(path)
+    config = manager.get_config()
+
+    with open(path, "a") as f:
+        f.write("\nsystem: on\n")
+    _touch(path, 5)
+    assert manager.has_changed()
+    with pytest.raises(ValueError):
+        manager.reload()
+    assert manager.get_config() is config
+    # 同一个错误文件不会在每轮主循环中重复解析
+    assert not manager.has_changed()
+
+    shutil.copy(CONFIG, path)
+    _touch(path, 10)
+    assert manager.has_changed()
+    assert manager.reload() is False
+
+
+@pytest.mark.parametrize("alerts", ["file", "[file]", "1"])
+def test_alerts_must_be_a_mapping(tmp_path, alerts):
+    path = str(tmp_path / "config.yaml")
+    shutil.copy(CONFIG, path)
+    with open(path, "a") as f:
+        f.write(f"\nalerts: {alerts}\n")
+    with pytest.raises(ValueError, match="Alerts must be a mapping"):
+        ConfigManager(path)
@@ -0,0 +1,38 @@
+from monitors import sampling
+from monitors.sampling import AdaptiveSampler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_flood_is_bounded_within_the_first_window(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sampling.time, "monotonic", clock)
+    sampler = AdaptiveSampler(budget=1000, window=0.05)
+    # 约 140 万包/秒的突发，持续半个周期
+    for _ in range(35000):
+        clock.now += 0.0000007
+        sampler.sample()
+    assert sampler.rate >= 1000
+    assert sampler.kept < 2 * 1000 * 0.05 + 35
+
+    # 流量回落后，下一个完整周期结束时恢复全量处理
+    for _ in range(2):
+        clock.now += 0.1
+        sampler.sample()
+    assert sampler.rate == 1
+
+
+def test_low_rate_is_not_sampled(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sampling.time, "monotonic", clock)
+    sampler = AdaptiveSampler(budget=1000, window=0.05)
+    for _ in range(1000):
+        clock.now += 0.002
+        assert sampler.sample()
+    assert sampler.rate == 1
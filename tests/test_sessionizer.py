@@ -0,0 +1,33 @@
+import time
+
+from processors.sessionizer import Sessionizer
+
+
+def _record(epoch, src_ip, url='/'):
+    return {'interface': 'nginx', 'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(epoch)),
+            'url': url, 'site': 'a.com', 'src_ip': src_ip, 'user_agent': 'ua'}
+
+
+def test_distinct_urls_estimate_is_capped(tmp_path):
+    sessionizer = Sessionizer(str(tmp_path), 'hour', max_urls=100)
+    start = 1700000000
+    sessionizer.process([_record(start, '1.1.1.1', f'/a/{i}') for i in range(50)])
+    sessionizer.process([_record(start, '2.2.2.2', f'/b/{i}') for i in range(5000)])
+    sessionizer.close()
+    sessions = tmp_path.glob('*/*.sessions.csv')
+    rows = [line.split(',') for path in sessions for line in path.read_text().splitlines()[1:]]
+    distinct = {row[4]: int(row[7]) for row in rows}
+    assert 45 <= distinct['1.1.1.1'] <= 55
+    assert distinct['2.2.2.2'] == 100
+
+
+def test_every_open_session_stays_scheduled(tmp_path):
+    sessionizer = Sessionizer(str(tmp_path), 'hour', gap=10, max_sessions=3)
+    epoch = 1700000000
+    for step in range(200):
+        epoch += step % 7
+        sessionizer.process([_record(epoch, str((step * 5 + i) % 6)) for i in range(1 + step % 4)])
+        live = {(sequence, key) for _, sequence, key in sessionizer.expiry}
+        for key, session in sessionizer.sessions.items():
+            assert (session.sequence, key) in live
+        assert len(sessionizer.sessions) <= 3
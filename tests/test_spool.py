@@ -0,0 +1,24 @@
+import os
+
+from writers.spool import DiskSpool
+
+
+def test_records_survive_process_crash(tmp_path):
+    path = str(tmp_path / "spool")
+    pid = os.fork()
+    if pid == 0:
+        spool = DiskSpool(path)
+        for i in range(50):
+            spool.put({"nginx": [{"url": f"/x{i}"}]})
+        # 模拟进程崩溃：不关闭、不刷新任何缓冲
+        os._exit(1)
+    os.waitpid(pid, 0)
+
+    spool = DiskSpool(path)
+    try:
+        items, position = spool.read_batch()
+        assert [item["nginx"][0]["url"] for item in items] == [f"/x{i}" for i in range(50)]
+        spool.commit(position)
+        assert spool.read_batch()[0] == []
+    finally:
+        spool.close()
@@ -0,0 +1,50 @@
+from processors.url_normalizer import UrlNormalizer, RouteTrie
+
+
+def normalize(normalizer, url):
+    packet = {'interface': 'nginx', 'url': url}
+    normalizer.process([packet])
+    return packet['route']
+
+
+def test_placeholders_and_query():
+    normalizer = UrlNormalizer(keep_params=['page'])
+    assert normalize(normalizer, 'https://a.com/api/users/123/orders?page=2&t=1') == '/api/users/{int}/orders?page=2'
+    assert normalize(normalizer, 'https://a.com/f/65daa50aec10431ba73fe320d92ff5a1') == '/f/{hash}'
+    assert normalize(normalizer, 'https://a.com/x/deb55ebe-5eb3-4654-b6b3-4a710dfc6852/') == '/x/{uuid}/'
+    assert normalize(normalizer, 'https://a.com') == '/'
+
+
+def test_high_cardinality_position_generalizes():
+    normalizer = UrlNormalizer(max_children=10)
+    for i in range(20):
+        normalize(normalizer, f'https://a.com/user/name{i}/posts')
+    assert normalize(normalizer, 'https://a.com/user/name0/posts') == '/user/{var}/posts'
+    assert normalize(normalizer, 'https://a.com/api/status') == '/api/status'
+
+
+def test_many_hosts_keep_their_own_top_level_paths():
+    normalizer = UrlNormalizer(max_children=10)
+    for i in range(50):
+        for section in ('api', 'static', f'only{i}'):
+            normalize(normalizer, f'https://site{i}.example.com/{section}/list')
+    for i in range(50):
+        assert normalize(normalizer, f'https://site{i}.example.com/api/list') == '/api/list'
+        assert normalize(normalizer, f'https://site{i}.example.com/only{i}/list') == f'/only{i}/list'
+    assert normalizer.trie.generalized == 0
+
+
+def test_generalizing_one_host_does_not_affect_another():
+    normalizer = UrlNormalizer(max_children=5)
+    assert normalize(normalizer, 'https://b.com/user/alice') == '/user/alice'
+    for i in range(10):
+        normalize(normalizer, f'https://a.com/user/u{i}')
+    assert normalize(normalizer, 'https://a.com/user/alice') == '/user/{var}'
+    assert normalize(normalizer, 'https://b.com/user/alice') == '/user/alice'
+
+
+def test_sites_over_limit_share_one_scope():
+    trie = RouteTrie(max_scopes=2)
+    for name in ('a', 'b', 'c', 'd'):
+        trie.template('/x', trie.scope(name))
+    assert sorted(trie.root.children) == ['(other)', 'a', 'b']
@@ -0,0 +1,158 @@
+import socket
+import threading
+import time
+import logging
+from collections import deque
+from typing import List, Dict, Optional
+
+from transport.protocol import FRAME_HEADER, ACK, parse_address, encode_batch, recv_exact
+
+logger = logging.getLogger(__name__)
+
+class RecordShipper:
+    """代理模式下将监控数据批量压缩后发送到汇聚端，收到确认后才丢弃本地缓存"""
+
+    def __init__(self, address: str, host: Optional[str] = None, batch_size: int = 5000,
+                 buffer_records: int = 1000000, compress_level: int = 1, ack_timeout: int = 30,
+                 max_backoff: int = 30):
+        """
+        初始化发送器
+
+        Args:
+            address: 汇聚端地址，host:port 或 unix:/path
+            host: 本机标识，默认为主机名
+            batch_size: 每批最多记录数
+            buffer_records: 汇聚端不可用时本地最多缓存的记录数，超过后丢弃最旧的批次
+            compress_level: zlib 压缩级别
+            ack_timeout: 等待确认的超时时间（秒）
+            max_backoff: 重连退避的最长间隔（秒）
+        """
+        self.family, self.address = parse_address(address)
+        self.host = host or socket.gethostname()
+        self.batch_size = batch_size
+        self.buffer_records = buffer_records
+        self.compress_level = compress_level
+        self.ack_timeout = ack_timeout
+        self.max_backoff = max_backoff
+        self.pending = deque()  # (记录数, 压缩后的负载)
+        self.buffered = 0
+        self.condition = threading.Condition()
+        self.sock = None
+        self.seq = 0
+        self.is_running = False
+        self.thread = None
+        self.sent_records = 0
+        self.sent_bytes = 0
+        self.dropped_records = 0
+        self.reconnects = 0
+
+    def send(self, packet_dicts: List[Dict]) -> None:
+        """将 {interface: [packet_info, ...]} 列表加入发送缓存"""
+        batch = []
+        count = 0
+        for packet_dict in packet_dicts:
+            batch.append(packet_dict)
+            count += sum(len(packets) for packets in packet_dict.values())
+            if count >= self.batch_size:
+                self._enqueue(batch, count)
+                batch, count = [], 0
+        if batch:
+            self._enqueue(batch, count)
+
+    def _enqueue(self, batch: List[Dict], count: int) -> None:
+        payload = encode_batch(self.host, batch, self.compress_level)
+        with self.condition:
+            self.pending.append((count, payload))
+            self.buffered += count
+            while self.buffered > self.buffer_records and len(self.pending) > 1:
+                dropped, _ = self.pending.popleft()
+                self.buffered -= dropped
+                self.dropped_records += dropped
+            self.condition.notify()
+
+    def _connect(self) -> None:
+        backoff = 1
+        while self.is_running:
+            sock = socket.socket(self.family, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(self.ack_timeout)
+                sock.connect(self.address)
+                if self.family == socket.AF_INET:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.sock = sock
+                logger.info(f"Connected to collector {self.address}")
+                return
+            except OSError as e:
+                sock.close()
+                self.reconnects += 1
+                logger.warning(f"Failed to connect to collector {self.address}: {e}, retry in {backoff}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _disconnect(self) -> None:
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def _ship(self) -> None:
+        while self.is_running:
+            with self.condition:
+                while self.is_running and not self.pending:
+                    self.condition.wait(1)
+                if not self.pending:
+                    continue
+                count, payload = self.pending[0]
+            if self.sock is None:
+                self._connect()
+                if self.sock is None:
+                    continue
+            self.seq += 1
+            try:
+                self.sock.sendall(FRAME_HEADER.pack(len(payload), self.seq) + payload)
+                acked, = ACK.unpack(recv_exact(self.sock, ACK.size))
+                if acked != self.seq:
+                    raise ConnectionError(f"Unexpected ack {acked}, expected {self.seq}")
+            except (OSError, ConnectionError) as e:
+                # 未确认的批次保留在缓存中，重连后重新发送
+                logger.warning(f"Lost connection to collector: {e}")
+                self._disconnect()
+                continue
+            with self.condition:
+                if self.pending and self.pending[0][1] is payload:
+                    self.pending.popleft()
+                    self.buffered -= count
+            self.sent_records += count
+            self.sent_bytes += len(payload)
+
+    def stats(self) -> Dict:
+        return {
+            "sent_records": self.sent_records,
+            "sent_bytes": self.sent_bytes,
+            "buffered_records": self.buffered,
+            "dropped_records": self.dropped_records,
+            "reconnects": self.reconnects,
+        }
+
+    def start(self) -> None:
+        if not self.is_running:
+            self.is_running = True
+            self.thread = threading.Thread(target=self._ship, name="agent-shipper")
+            self.thread.daemon = True
+            self.thread.start()
+            logger.info(f"Agent shipper started, collector: {self.address}")
+
+    def stop(self, drain_timeout: int = 10) -> None:
+        """停止发送，先在 drain_timeout 秒内尽量发送剩余数据"""
+        if self.is_running:
+            deadline = time.monotonic() + drain_timeout
+            while self.pending and self.sock is not None and time.monotonic() < deadline:
+                time.sleep(0.1)
+            self.is_running = False
+            with self.condition:
+                self.condition.notify_all()
+            if self.thread:
+                self.thread.join()
+            self._disconnect()
+            if self.buffered:
+                logger.warning(f"Agent shipper stopped with {self.buffered} records not delivered")
+            logger.info("Agent shipper stopped")
@@ -0,0 +1,125 @@
+import os
+import zlib
+import socket
+import socketserver
+import threading
+import logging
+from typing import Dict
+
+from monitors.base_monitor import BaseMonitor
+from transport.protocol import FRAME_HEADER, ACK, MAX_FRAME_SIZE, parse_address, decode_batch, recv_exact
+
+logger = logging.getLogger(__name__)
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _ThreadingUnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class RecordCollector(BaseMonitor):
+    """汇聚模式下接收多个代理发送的数据，接口与监控器一致，数据经由同一队列交给记录器"""
+
+    def __init__(self, address: str, packet_queue=None):
+        """
+        初始化汇聚端
+
+        Args:
+            address: 监听地址，host:port 或 unix:/path
+            packet_queue: 输出队列，默认为内存队列
+        """
+        super().__init__(packet_queue)
+        self.family, self.address = parse_address(address)
+        self.server = None
+        self.lock = threading.Lock()
+        self.received_records = 0
+        self.received_bytes = 0
+        self.agents: Dict[str, int] = {}
+        self.connections = set()
+
+    def _make_handler(self):
+        collector = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                peer = self.client_address or "unix"
+                logger.info(f"Agent connected: {peer}")
+                with collector.lock:
+                    collector.connections.add(self.request)
+                try:
+                    while True:
+                        length, seq = FRAME_HEADER.unpack(recv_exact(self.request, FRAME_HEADER.size))
+                        if length > MAX_FRAME_SIZE:
+                            raise ValueError(f"Frame too large: {length}")
+                        payload = recv_exact(self.request, length)
+                        collector._accept(decode_batch(payload), len(payload))
+                        self.request.sendall(ACK.pack(seq))
+                except ConnectionError:
+                    pass
+                except (OSError, ValueError, zlib.error) as e:
+                    # 损坏的帧：记录错误并关闭连接，代理重连后重发未确认的批次
+                    logger.error(f"Error receiving from agent {peer}: {e}")
+                finally:
+                    with collector.lock:
+                        collector.connections.discard(self.request)
+                logger.info(f"Agent disconnected: {peer}")
+
+        return Handler
+
+    def _accept(self, batch: Dict, size: int) -> None:
+        host = batch.get("host", "unknown")
+        count = 0
+        for packet_dict in batch.get("records", []):
+            for packets in packet_dict.values():
+                for packet in packets:
+                    packet["host"] = host
+                count += len(packets)
+            self.packet_queue.put(packet_dict)
+        with self.lock:
+            self.received_records += count
+            self.received_bytes += size
+            self.agents[host] = self.agents.get(host, 0) + count
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "received_records": self.received_records,
+                "received_bytes": self.received_bytes,
+                "agents": dict(self.agents),
+            }
+
+    def start(self) -> None:
+        if not self.is_running:
+            handler = self._make_handler()
+            if self.family == socket.AF_UNIX:
+                if os.path.exists(self.address):
+                    os.remove(self.address)
+                self.server = _ThreadingUnixServer(self.address, handler)
+            else:
+                self.server = _ThreadingTCPServer(self.address, handler)
+            self.is_running = True
+            self.thread = threading.Thread(target=self.server.serve_forever, name="collector")
+            self.thread.daemon = True
+            self.thread.start()
+            logger.info(f"Collector listening on {self.address}")
+
+    def stop(self) -> None:
+        if self.is_running:
+            self.is_running = False
+            self.server.shutdown()
+            self.server.server_close()
+            # 关闭已建立的连接，未确认的批次由代理重发
+            with self.lock:
+                for connection in self.connections:
+                    try:
+                        connection.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+            if self.thread:
+                self.thread.join()
+            if self.family == socket.AF_UNIX and os.path.exists(self.address):
+                os.remove(self.address)
+            logger.info("Collector stopped")
@@ -0,0 +1,41 @@
+import json
+import socket
+import struct
+import zlib
+from typing import List, Dict, Tuple
+
+# 帧格式：4字节负载长度 + 8字节批次序号 + zlib压缩的JSON；确认帧为8字节批次序号
+FRAME_HEADER = struct.Struct("!IQ")
+ACK = struct.Struct("!Q")
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+
+def parse_address(address: str) -> Tuple[int, object]:
+    """解析 host:port 或 unix:/path 形式的地址，返回 (地址族, 套接字地址)"""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid address {address}, expected host:port or unix:/path")
+    return socket.AF_INET, (host, int(port))
+
+
+def encode_batch(host: str, packet_dicts: List[Dict], compress_level: int = 1) -> bytes:
+    body = json.dumps({"host": host, "records": packet_dicts}, ensure_ascii=False, separators=(',', ':'))
+    return zlib.compress(body.encode("utf-8"), compress_level)
+
+
+def decode_batch(payload: bytes) -> Dict:
+    return json.loads(zlib.decompress(payload))
+
+
+def recv_exact(sock: socket.socket, size: int) -> bytes:
+    """读取指定长度的数据，连接关闭时抛出 ConnectionError"""
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("Connection closed by peer")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
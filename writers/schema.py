@@ -0,0 +1,130 @@
+import csv
+import json
+from json.encoder import encode_basestring
+from typing import Callable, Dict, List, NamedTuple, Sequence
+
+class Field(NamedTuple):
+    name: str
+    kind: str  # str、int 或 float，决定 JSON 编码的快速路径和 SQLite 列类型
+    source: str  # common / nginx / network，仅作说明
+
+
+# 记录字段只在这里声明一次，各输出格式的序列化函数由此生成；顺序即 CSV 列顺序，新字段追加到末尾
+RECORD_FIELDS: List[Field] = [
+    Field('timestamp', 'str', 'common'),
+    Field('src_ip', 'str', 'common'),
+    Field('src_port', 'int', 'common'),
+    Field('interface', 'str', 'common'),
+    Field('url', 'str', 'nginx'),
+    Field('user_agent', 'str', 'nginx'),
+    Field('host', 'str', 'common'),
+    Field('sample_rate', 'int', 'network'),
+    Field('packets', 'int', 'network'),
+    Field('status', 'int', 'nginx'),
+    Field('body_bytes', 'int', 'nginx'),
+    Field('site', 'str', 'nginx'),
+    Field('dest_ip', 'str', 'network'),
+    Field('dest_port', 'int', 'network'),
+    Field('protocol', 'int', 'network'),
+    Field('bytes', 'int', 'network'),
+    Field('last_seen', 'str', 'network'),
+    Field('blocklisted', 'str', 'common'),
+    Field('request_time', 'float', 'nginx'),
+    Field('upstream_time', 'float', 'nginx'),
+    Field('route', 'str', 'nginx'),
+]
+FIELD_NAMES: List[str] = [field.name for field in RECORD_FIELDS]
+FIELD_KINDS: Dict[str, str] = {field.name: field.kind for field in RECORD_FIELDS}
+
+FORMATS = ('csv', 'txt', 'log', 'jsonl', 'sqlite')
+
+# txt/log 的固定部分，其余字段存在时以 key=value 追加
+TEXT_LAYOUT = ('timestamp', 'src_ip', 'src_port', 'dest_ip', 'dest_port', 'interface', 'url', 'user_agent')
+
+_compiled: Dict[tuple, Callable] = {}
+
+
+def _compile(name: str, source: str, namespace: Dict) -> Callable:
+    exec(compile(source, f"<serializer {name}>", "exec"), namespace)
+    return namespace[name]
+
+
+def compile_row(fields: Sequence[str], missing='') -> Callable[[Dict], tuple]:
+    """生成按列顺序取值的函数，缺失字段取 missing（CSV 为空字符串，SQLite 为 None）"""
+    key = ('row', tuple(fields), missing)
+    function = _compiled.get(key)
+    if function is None:
+        values = ", ".join(f"get({name!r}, {missing!r})" for name in fields)
+        source = f"def row(record):\n    get = record.get\n    return ({values},)\n"
+        function = _compile("row", source, {})
+        _compiled[key] = function
+    return function
+
+
+def compile_jsonl(fields: Sequence[str] = FIELD_NAMES) -> Callable[[Dict], str]:
+    """
+    生成 JSON Lines 序列化函数
+
+    按字段类型内联编码：字符串走 C 实现的转义，整数直接 str()，浮点数直接 repr()，类型不符时回退到 json.dumps；
+    缺失或为 None 的字段不输出。
+    """
+    key = ('jsonl', tuple(fields))
+    function = _compiled.get(key)
+    if function is None:
+        lines = ["def line(record):", "    get = record.get", "    parts = []", "    append = parts.append"]
+        for name in fields:
+            prefix = json.dumps(name) + ":"
+            if FIELD_KINDS.get(name) == 'int':
+                encoded = "str(value) if type(value) is int else dumps(value)"
+            elif FIELD_KINDS.get(name) == 'float':
+                encoded = "repr(value) if type(value) is float else dumps(value)"
+            else:
+                encoded = "escape(value) if type(value) is str else dumps(value, ensure_ascii=False)"
+            lines += [f"    value = get({name!r})",
+                      "    if value is not None:",
+                      f"        append({prefix!r} + ({encoded}))"]
+        lines.append("    return '{' + ','.join(parts) + '}\\n'")
+        function = _compile("line", "\n".join(lines) + "\n", {"escape": encode_basestring, "dumps": json.dumps})
+        _compiled[key] = function
+    return function
+
+
+def compile_text(prefix: str, fields: Sequence[str] = FIELD_NAMES) -> Callable[[Dict], str]:
+    """
+    生成 txt/log 行格式化函数，prefix 为行首的 f-string 模板（可引用 get）
+
+    固定部分缺失的字段显示为 N/A，其余字段存在时以 key=value 追加，不会因记录类型不同而缺少字段报错。
+    """
+    key = ('text', prefix, tuple(fields))
+    function = _compiled.get(key)
+    if function is None:
+        extras = [name for name in fields if name not in TEXT_LAYOUT]
+        lines = ["def line(record):", "    get = record.get",
+                 "    text = (f\"" + prefix.replace('"', '\\"') +
+                 "{get('src_ip', 'N/A')}:{get('src_port', 'N/A')} -> "
+                 "{get('dest_ip', 'N/A')}:{get('dest_port', 'N/A')} Interface: {get('interface', 'N/A')} "
+                 "URL: {get('url', 'N/A')} User-Agent: {get('user_agent', 'N/A')}\")"]
+        for name in extras:
+            lines += [f"    value = get({name!r})",
+                      "    if value is not None:",
+                      f"        text += {' ' + name + '='!r} + str(value)"]
+        lines.append("    return text + '\\n'")
+        function = _compile("line", "\n".join(lines) + "\n", {})
+        _compiled[key] = function
+    return function
+
+
+def compile_serializer(format: str) -> Callable[[Dict], str]:
+    """返回 txt、log、jsonl 格式的单行序列化函数；csv 由 compile_row 配合 csv.writer 输出"""
+    if format == 'jsonl':
+        return compile_jsonl()
+    if format == 'txt':
+        return compile_text("{get('timestamp', 'N/A')} ")
+    if format == 'log':
+        return compile_text("[{get('timestamp', 'N/A')}] INFO - Traffic: ")
+    raise ValueError(f"Unsupported format {format}, must be one of {FORMATS}")
+
+
+def write_csv_rows(f, fields: Sequence[str], records: List[Dict]) -> None:
+    """按列顺序写入 CSV 行，引号与转义由 C 实现的 csv.writer 处理"""
+    csv.writer(f).writerows(map(compile_row(fields), records))
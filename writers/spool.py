@@ -0,0 +1,198 @@
+import os
+import json
+import threading
+import logging
+from typing import List, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+class DiskSpool:
+    """
+    监控器与记录器之间的磁盘预写队列
+
+    监控器通过 put() 追加数据到分段文件，记录器通过 read_batch() 读取、写入成功后 commit() 提交位置。
+    进程重启后从已提交位置重放尚未消费的数据。每条数据在 put() 返回前已直接写入文件描述符（不经用户态缓冲），
+    进程崩溃时不丢失；不调用 fsync，操作系统崩溃或断电时可能丢失尚未落盘的部分。
+    """
+
+    SEGMENT_SUFFIX = ".spool"
+    COMMIT_FILE = "commit"
+
+    def __init__(self, path: str, segment_size_mb: int = 16, max_segments: int = 64,
+                 overflow: str = "drop_oldest"):
+        """
+        初始化磁盘队列
+
+        Args:
+            path: 队列文件目录
+            segment_size_mb: 单个分段文件大小上限（MB）
+            max_segments: 分段文件数量上限，超过后按 overflow 策略处理
+            overflow: 溢出策略，drop_oldest 丢弃最旧分段，drop_new 丢弃新数据
+        """
+        if overflow not in ("drop_oldest", "drop_new"):
+            raise ValueError("Spool overflow must be 'drop_oldest' or 'drop_new'")
+        if max_segments < 2:
+            raise ValueError("Spool max_segments must be at least 2")
+        self.path = path
+        self.segment_size = segment_size_mb * 1024 * 1024
+        self.max_segments = max_segments
+        self.overflow = overflow
+        self.dropped = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+        self.committed = self._load_commit()
+        self.read_position = self.committed
+        segments = self._list_segments()
+        # 每次启动使用新分段，上次异常退出时残留的半行留在旧分段中由读取时跳过
+        self.write_index = segments[-1] + 1 if segments else self.committed[0]
+        self.write_fd = None
+        self.write_size = 0
+        self._open_write_segment()
+        if segments:
+            logger.info(f"Spool {self.path} has {len(segments)} segments to replay from {self.committed}")
+
+    def _segment_path(self, index: int) -> str:
+        return os.path.join(self.path, f"{index:012d}{self.SEGMENT_SUFFIX}")
+
+    def _list_segments(self) -> List[int]:
+        indexes = []
+        for name in os.listdir(self.path):
+            if name.endswith(self.SEGMENT_SUFFIX):
+                try:
+                    indexes.append(int(name[:-len(self.SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(indexes)
+
+    def _load_commit(self) -> Tuple[int, int]:
+        commit_path = os.path.join(self.path, self.COMMIT_FILE)
+        if os.path.exists(commit_path):
+            try:
+                with open(commit_path, 'r') as f:
+                    index, offset = f.read().split()
+                return int(index), int(offset)
+            except (OSError, ValueError) as e:
+                logger.error(f"Invalid spool commit file {commit_path}: {e}")
+        segments = self._list_segments()
+        return (segments[0] if segments else 0), 0
+
+    def _open_write_segment(self) -> None:
+        if self.write_fd is not None:
+            os.close(self.write_fd)
+        self.write_fd = os.open(self._segment_path(self.write_index), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.write_size = os.fstat(self.write_fd).st_size
+
+    def _drop_oldest_segment(self) -> None:
+        segments = self._list_segments()
+        oldest = segments[0]
+        path = self._segment_path(oldest)
+        with open(path, 'rb') as f:
+            self.dropped += sum(1 for _ in f)
+        os.remove(path)
+        if self.read_position[0] <= oldest:
+            self.read_position = (oldest + 1, 0)
+        if self.committed[0] <= oldest:
+            self.committed = (oldest + 1, 0)
+            self._write_commit()
+        logger.warning(f"Spool full, dropped oldest segment {path}")
+
+    def put(self, item: Dict) -> None:
+        """追加一条数据，接口与 queue.Queue.put 一致"""
+        line = (json.dumps(item, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+        with self.lock:
+            if self.write_size + len(line) > self.segment_size and self.write_size > 0:
+                if len(self._list_segments()) >= self.max_segments:
+                    if self.overflow == "drop_new":
+                        self.dropped += 1
+                        return
+                    self._drop_oldest_segment()
+                self.write_index += 1
+                self._open_write_segment()
+            # 直接写入页缓存，进程崩溃后数据仍在文件中
+            written = os.write(self.write_fd, line)
+            while written < len(line):
+                written += os.write(self.write_fd, line[written:])
+            self.write_size += len(line)
+
+    def read_batch(self, max_items: int = 10000) -> Tuple[List[Dict], Tuple[int, int]]:
+        """
+        从读取位置开始读取一批数据
+
+        Returns:
+            (数据列表, 读取结束位置)，写入成功后应将该位置传给 commit()
+        """
+        with self.lock:
+            write_index = self.write_index
+        items = []
+        index, offset = self.read_position
+        while len(items) < max_items and index <= write_index:
+            path = self._segment_path(index)
+            if not os.path.exists(path):
+                index, offset = index + 1, 0
+                continue
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                while len(items) < max_items:
+                    line = f.readline()
+                    if not line:
+                        break
+                    if not line.endswith(b"\n"):
+                        if index == write_index:
+                            break
+                        # 异常退出遗留的半行
+                        offset += len(line)
+                        continue
+                    offset += len(line)
+                    try:
+                        items.append(json.loads(line))
+                    except ValueError:
+                        logger.error(f"Skipping corrupt spool record in {path}")
+            if len(items) < max_items and index < write_index:
+                index, offset = index + 1, 0
+            else:
+                break
+        self.read_position = (index, offset)
+        return items, self.read_position
+
+    def commit(self, position: Tuple[int, int]) -> None:
+        """提交消费位置，并删除已完全消费的分段"""
+        with self.lock:
+            self.committed = position
+            self._write_commit()
+            for index in self._list_segments():
+                if index >= position[0]:
+                    break
+                os.remove(self._segment_path(index))
+
+    def rewind(self) -> None:
+        """写入失败时将读取位置退回到已提交位置，下次重新读取"""
+        self.read_position = self.committed
+
+    def _write_commit(self) -> None:
+        commit_path = os.path.join(self.path, self.COMMIT_FILE)
+        tmp_path = commit_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(f"{self.committed[0]} {self.committed[1]}")
+        os.replace(tmp_path, commit_path)
+
+    def backlog_bytes(self) -> int:
+        """已写入但尚未提交的数据量（字节）"""
+        with self.lock:
+            backlog = -self.committed[1]
+            for index in self._list_segments():
+                if index < self.committed[0]:
+                    continue
+                if index == self.write_index:
+                    backlog += self.write_size
+                else:
+                    backlog += os.path.getsize(self._segment_path(index))
+        return max(backlog, 0)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.write_fd is not None:
+                os.close(self.write_fd)
+                self.write_fd = None
+        if self.dropped:
+            logger.warning(f"Spool dropped {self.dropped} records due to overflow")
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import logging
+import threading
+from typing import List, Dict
+
+from writers.schema import RECORD_FIELDS, compile_row
+
+logger = logging.getLogger(__name__)
+
+class SqliteSegment:
+    """
+    单个分段的 SQLite 数据库
+
+    WAL 模式，每批记录在一个事务内用同一条预编译语句 executemany 插入；
+    按 timestamp、src_ip、site 建索引，分段结束时执行 ANALYZE 和 VACUUM 压缩。
+    """
+
+    TABLE = "records"
+    INDEXES = ("timestamp", "src_ip", "site")
+    COLUMN_TYPES = {"int": "INTEGER", "float": "REAL"}
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.columns = self._ensure_schema()
+        self.row = compile_row(self.columns, None)
+        placeholders = ", ".join("?" for _ in self.columns)
+        self.insert_sql = f"INSERT INTO {self.TABLE} ({', '.join(self.columns)}) VALUES ({placeholders})"
+
+    def _ensure_schema(self) -> List[str]:
+        """建表并补齐字段表中新增的列，返回当前列顺序"""
+        column_types = {field.name: self.COLUMN_TYPES.get(field.kind, "TEXT") for field in RECORD_FIELDS}
+        with self.connection:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.TABLE} "
+                f"({', '.join(f'{name} {kind}' for name, kind in column_types.items())})")
+            existing = [row[1] for row in self.connection.execute(f"PRAGMA table_info({self.TABLE})")]
+            for name, kind in column_types.items():
+                if name not in existing:
+                    self.connection.execute(f"ALTER TABLE {self.TABLE} ADD COLUMN {name} {kind}")
+                    existing.append(name)
+            for column in self.INDEXES:
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_{column} ON {self.TABLE} ({column})")
+        return [name for name in existing if name in column_types]
+
+    def insert(self, packets: List[Dict]) -> None:
+        with self.connection:
+            self.connection.executemany(self.insert_sql, map(self.row, packets))
+
+    def close(self, compact: bool = False) -> None:
+        """关闭数据库；compact 为 True 时先执行 ANALYZE 和 VACUUM，否则只把 WAL 合并回数据库文件"""
+        if compact:
+            try:
+                self.connection.execute("ANALYZE")
+                self.connection.execute("VACUUM")
+                self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                logger.info(f"Compacted {self.filename}")
+            except sqlite3.Error as e:
+                logger.error(f"Failed to compact {self.filename}: {e}")
+        else:
+            try:
+                self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                logger.error(f"Failed to checkpoint {self.filename}: {e}")
+        self.connection.close()
+
+
+class SqliteStore:
+    """按分段文件名切换数据库，旧分段在后台线程中压缩，不阻塞写入"""
+
+    def __init__(self):
+        self.segment = None
+        self.compactions: List[threading.Thread] = []
+
+    def write(self, filename: str, packets: List[Dict]) -> None:
+        if self.segment is None or self.segment.filename != filename:
+            self.rotate()
+            self.segment = SqliteSegment(filename)
+        self.segment.insert(packets)
+
+    def rotate(self) -> None:
+        """结束当前分段，压缩在后台进行"""
+        if self.segment is None:
+            return
+        segment, self.segment = self.segment, None
+        thread = threading.Thread(target=segment.close, args=(True,), name=f"sqlite-compact-{os.path.basename(segment.filename)}")
+        thread.daemon = True
+        thread.start()
+        self.compactions = [thread for thread in self.compactions if thread.is_alive()] + [thread]
+
+    def close(self) -> None:
+        """
+        停止时调用：等待已切换分段的压缩完成，当前分段不压缩直接关闭，
+        重启后在同一分段继续写入时不必每次重写整个文件
+        """
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+        for thread in self.compactions:
+            thread.join()
+        self.compactions = []
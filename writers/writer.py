@@ -4,11 +4,47 @@ import csv
 from typing import List, Dict
 import logging
 
+from writers.schema import FIELD_NAMES, compile_serializer, write_csv_rows
+from writers.sqlite_store import SqliteStore
+
 logger = logging.getLogger(__name__)
 
+def segment_filename(path: str, interval_type: str, extension: str, now: time.struct_time = None) -> str:
+    """
+    按分段规则生成文件名，如 path/2025-03/20250318_14.csv
+
+    同一分段的附属文件（汇总、关联结果等）使用不同的扩展名，与原始记录文件放在一起。
+    """
+    now = now or time.localtime()
+    month_dir = time.strftime("%Y-%m", now)
+    full_path = os.path.join(path, month_dir)
+    os.makedirs(full_path, exist_ok=True)
+
+    if interval_type == "week":
+        timestamp = time.strftime("%Y%m%d", now) + f"_week{now.tm_yday // 7}"
+    elif interval_type == "hour":
+        timestamp = time.strftime("%Y%m%d_%H", now)
+    else:  # day
+        timestamp = time.strftime("%Y%m%d", now)
+
+    return os.path.join(full_path, f"{timestamp}.{extension}")
+
+def append_csv(filename: str, headers: List[str], rows: List[Dict]) -> None:
+    """追加写入CSV，新文件写入表头；已有文件沿用其表头，避免字段增加后与旧文件错位"""
+    mode = 'a' if os.path.exists(filename) and os.path.getsize(filename) > 0 else 'w'
+    if mode == 'a':
+        with open(filename, 'r', newline='') as f:
+            headers = next(csv.reader(f), None) or headers
+    with open(filename, mode, newline='') as f:
+        if mode == 'w':
+            csv.writer(f).writerow(headers)
+        write_csv_rows(f, headers, rows)
+
 class TrafficWriter:
     """网络流量记录器"""
 
+    CSV_HEADERS = FIELD_NAMES
+
     def __init__(self, path: str, format: str, interval_type: str, filter_superfluous_ip: bool = False, fake_img: bool = False):
         self.path = path
         self.format = format
@@ -16,22 +52,34 @@ class TrafficWriter:
         self.filter_superfluous_ip = filter_superfluous_ip
         self.fake_img = fake_img
         self.current_file = None
+        self.pending_settings = None
+        self.sqlite = SqliteStore()
         os.makedirs(self.path, exist_ok=True)
 
-    def _get_filename(self) -> str:
-        now = time.localtime()
-        month_dir = time.strftime("%Y-%m", now)
-        full_path = os.path.join(self.path, month_dir)
-        os.makedirs(full_path, exist_ok=True)
+    def reconfigure(self, **settings) -> None:
+        """
+        更新记录器设置（path、format、interval_type、filter_superfluous_ip、fake_img）
 
-        if self.interval_type == "week":
-            timestamp = time.strftime("%Y%m%d", now) + f"_week{time.localtime().tm_yday // 7}"
-        elif self.interval_type == "hour":
-            timestamp = time.strftime("%Y%m%d_%H", now)
-        else:  # day
-            timestamp = time.strftime("%Y%m%d", now)
+        新设置在下一个分段文件开始时生效，当前分段仍按旧设置写完。
+        """
+        changed = {key: value for key, value in settings.items() if getattr(self, key) != value}
+        if not changed:
+            self.pending_settings = None
+            return
+        self.pending_settings = changed
+        logger.info(f"Writer settings will switch at next segment boundary: {changed}")
+        if self.current_file is None:
+            self._apply_pending_settings()
+
+    def _apply_pending_settings(self) -> None:
+        for key, value in self.pending_settings.items():
+            setattr(self, key, value)
+        self.pending_settings = None
+        os.makedirs(self.path, exist_ok=True)
+        logger.info("Writer settings switched")
 
-        return os.path.join(full_path, f"{timestamp}.{self.format}")
+    def _get_filename(self) -> str:
+        return segment_filename(self.path, self.interval_type, self.format)
 
     def _merge_packets(self, packets: List[Dict]) -> List[Dict]:
         """仅对网卡流量数据包进行合并，Nginx日志不合并"""
@@ -42,12 +90,26 @@ class TrafficWriter:
             return packets
 
         merged = {}
+        copied = set()
         for packet in packets:
             key = (packet['src_ip'], packet['src_port'], packet['interface'])
-            if key in merged:
-                merged[key]['timestamp'] = packet['timestamp']
-            else:
+            current = merged.get(key)
+            if current is None:
                 merged[key] = packet
+            elif 'packets' not in packet:
+                current['timestamp'] = packet['timestamp']
+            else:
+                # 流记录：累加包数和字节数，时间取最早的首包和最晚的末包；
+                # 先复制一份，不修改同时交给其他输出的原记录
+                if key not in copied:
+                    current = merged[key] = dict(current)
+                    copied.add(key)
+                current['packets'] = (current.get('packets') or 0) + packet['packets']
+                current['bytes'] = (current.get('bytes') or 0) + (packet.get('bytes') or 0)
+                if packet['timestamp'] < current['timestamp']:
+                    current['timestamp'] = packet['timestamp']
+                if packet.get('last_seen', '') > current.get('last_seen', ''):
+                    current['last_seen'] = packet['last_seen']
         return list(merged.values())
 
     def _rename_to_original(self, filename: str) -> None:
@@ -67,53 +129,45 @@ class TrafficWriter:
         if not packets:
             return
 
-        filtered_packets = self._merge_packets(packets)
         filename = self._get_filename()
+        if self.pending_settings and filename != self.current_file:
+            self._apply_pending_settings()
+            filename = self._get_filename()
+        self.current_file = filename
+        filtered_packets = self._merge_packets(packets)
+
+        if self.format == "sqlite":
+            # 数据库保持打开，不做伪装
+            self._write_sqlite(filename, filtered_packets)
+            return
+        self.sqlite.rotate()
 
         # 写入前将伪装文件改回原始格式
         self._rename_to_original(filename)
 
         if self.format == "csv":
             self._write_csv(filename, filtered_packets)
-        elif self.format == "txt":
-            self._write_txt(filename, filtered_packets)
-        else:  # log
-            self._write_log(filename, filtered_packets)
+        else:  # txt / log / jsonl
+            self._write_lines(filename, filtered_packets)
 
         # 写入后根据 fake_img 设置伪装
         if self.fake_img:
             self._rename_to_fake(filename)
 
     def _write_csv(self, filename: str, packets: List[Dict]) -> None:
-        headers = ['timestamp', 'src_ip', 'src_port', 'interface', 'url',
-                   'user_agent']
-        mode = 'a' if os.path.exists(filename) else 'w'
-        with open(filename, mode, newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            if mode == 'w':
-                writer.writeheader()
-            # print(packets)
-            writer.writerows(packets)
+        append_csv(filename, self.CSV_HEADERS, packets)
+        logger.info(f"Wrote {len(packets)} packets to {filename}")
+
+    def _write_lines(self, filename: str, packets: List[Dict]) -> None:
+        serialize = compile_serializer(self.format)
+        with open(filename, 'a', encoding='utf-8') as f:
+            f.writelines(map(serialize, packets))
         logger.info(f"Wrote {len(packets)} packets to {filename}")
 
-    def _write_txt(self, filename: str, packets: List[Dict]) -> None:
-        with open(filename, 'a') as f:
-            for packet in packets:
-                f.write(f"{packet['timestamp']} {packet['src_ip']}:{packet['src_port']} -> "
-                        f"{packet['dest_ip']}:{packet['dest_port']} "
-                        f"MAC {packet['src_mac']} -> {packet['dest_mac']} "
-                        f"Interface: {packet['interface']} "
-                        f"URL: {packet.get('url', 'N/A')} "
-                        f"User-Agent: {packet.get('user_agent', 'N/A')}\n")
+    def _write_sqlite(self, filename: str, packets: List[Dict]) -> None:
+        self.sqlite.write(filename, packets)
         logger.info(f"Wrote {len(packets)} packets to {filename}")
 
-    def _write_log(self, filename: str, packets: List[Dict]) -> None:
-        with open(filename, 'a') as f:
-            for packet in packets:
-                f.write(f"[{packet['timestamp']}] INFO - Traffic: {packet['src_ip']}:{packet['src_port']} -> "
-                        f"{packet['dest_ip']}:{packet['dest_port']} "
-                        f"MAC {packet['src_mac']} -> {packet['dest_mac']} "
-                        f"Interface: {packet['interface']} "
-                        f"URL: {packet.get('url', 'N/A')} "
-                        f"User-Agent: {packet.get('user_agent', 'N/A')}\n")
-        logger.info(f"Wrote {len(packets)} packets to {filename}")
\ No newline at end of file
+    def close(self) -> None:
+        """关闭仍在写入的数据库分段"""
+        self.sqlite.close()